@@ -1,14 +1,129 @@
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, jsonify, request, render_template
+from flask.json.provider import DefaultJSONProvider
 from datetime import datetime, timedelta
-import uuid
+from bisect import bisect_right
+from contextlib import nullcontext
 from functools import wraps
+from itertools import islice
 import hashlib
+import os
+import time
+import zlib
+from urllib.parse import urlencode
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder is used instead
+    orjson = None
+
+from events import STREAM_PREAMBLE, EventHub, encode_events
+from records import TaskRecord
+from store import (CountIndex, HashIndex, SessionStore, SortedIndex, TagIndex, TextIndex,
+                   UniqueIndex, VersionIndex, open_backend)
+from tokens import TokenSigner, expiry_index
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """JSON provider that materializes compact records into dicts as they are serialized.
+    
+    When orjson is installed it encodes every response; otherwise this is
+    Flask's stdlib-based provider.
+    """
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, TaskRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+    
+    def _orjson_dumps(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+    
+    def dumps(self, obj, **kwargs):
+        # Formatting options are only understood by the stdlib encoder, which
+        # also takes what orjson refuses (integers beyond 64 bits)
+        if orjson is not None and not kwargs:
+            try:
+                return self._orjson_dumps(obj).decode()
+            except orjson.JSONEncodeError:
+                pass
+        return super().dumps(obj, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        if orjson is not None:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            try:
+                body = self._orjson_dumps(obj, indent)
+            except orjson.JSONEncodeError:
+                pass
+            else:
+                return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+        return super().response(*args, **kwargs)
 
 app = Flask(__name__)
+app.json = RecordJSONProvider(app)
 app.secret_key = 'your-secret-key-here'
 
-# In-memory databases
-users = {
+def parse_timestamp(value):
+    """Convert an ISO 8601 string to a POSIX timestamp; naive values are local time."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).timestamp()
+
+def is_valid_timestamp(value):
+    try:
+        parse_timestamp(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+# Storage backend: in-memory by default, STORAGE_URL=wal:///data to
+# keep it in memory but survive restarts, or e.g. STORAGE_URL=sqlite:///tasks.db
+# to persist the data and share it between worker processes (shm://tasks keeps
+# that database in shared memory). Paths after three slashes are relative to
+# the working directory; use four for an absolute one (wal:////var/lib/tasks)
+storage = open_backend(os.environ.get('STORAGE_URL', 'memory://'))
+
+def seed(table, records):
+    """Load the demo records into ``table`` unless it already holds data."""
+    if not table:
+        table.update(records)
+        storage.commit()
+
+# Change feed behind GET /events. Writes queue their events on the request;
+# they go out once the request has succeeded and its writes are committed.
+EVENTS_HISTORY = 10_000
+EVENTS_BUFFER_SIZE = 256
+event_hub = EventHub(history=EVENTS_HISTORY, buffer_size=EVENTS_BUFFER_SIZE)
+
+def queue_event(name, record, user_ids):
+    if not hasattr(request, 'pending_events'):
+        request.pending_events = []
+    request.pending_events.append((name, record, user_ids))
+
+# Registered before commit_writes so that it runs after it: Flask calls
+# after_request hooks in reverse order
+@app.after_request
+def publish_events(response):
+    if response.status_code < 400:
+        for name, record, user_ids in getattr(request, 'pending_events', ()):
+            event_hub.publish(name, app.json.dumps(record), user_ids)
+    return response
+
+@app.after_request
+def commit_writes(response):
+    # A request's writes are durable before its response goes out; concurrent
+    # requests share the log's fsyncs
+    storage.commit()
+    return response
+
+users = storage.table("users", UniqueIndex("email"), VersionIndex("id"))
+seed(users, {
     1: {
         "id": 1, 
         "name": "Pradnya", 
@@ -33,9 +148,10 @@ users = {
         "created_at": datetime.now().isoformat(),
         "is_active": True
     },
-}
+})
 
-projects = {
+projects = storage.table("projects", HashIndex("owner_id"), VersionIndex("owner_id"))
+seed(projects, {
     1: {
         "id": 1,
         "name": "Personal Development",
@@ -52,9 +168,44 @@ projects = {
         "created_at": datetime.now().isoformat(),
         "status": "active"
     }
-}
+})
+
+# Sort key given to tasks that lack the sorted field, so they come last
+SORT_LAST = float('inf')
+PRIORITY_RANKS = {"low": 0, "medium": 1, "high": 2}
 
-tasks = {
+tasks = storage.table(
+    "tasks",
+    HashIndex("assigned_to"),
+    HashIndex("created_by"),
+    HashIndex("project_id"),
+    HashIndex("status"),
+    HashIndex("priority"),
+    CountIndex("assigned_to", "status"),
+    CountIndex("assigned_to", "priority"),
+    CountIndex("project_id", "status"),
+    TagIndex("assigned_to", "tags"),
+    # Dates (parsed once per write) and priorities kept sorted per assignee,
+    # for ?sort= and the date range filters
+    SortedIndex("due_by_assigned_to", "assigned_to", "due_date", key=parse_timestamp,
+                missing=SORT_LAST),
+    SortedIndex("created_by_assigned_to", "assigned_to", "created_at", key=parse_timestamp,
+                missing=SORT_LAST),
+    SortedIndex("completed_by_assigned_to", "assigned_to", "completed_at", key=parse_timestamp,
+                missing=SORT_LAST),
+    SortedIndex("priority_rank_by_assigned_to", "assigned_to", "priority", key=PRIORITY_RANKS.get,
+                missing=SORT_LAST),
+    SortedIndex("open_due_by_assigned_to", "assigned_to", "due_date", key=parse_timestamp,
+                where=lambda task: task['status'] != 'completed'),
+    # Full-text search, with title words counting most
+    TextIndex("text", {"title": 3, "tags": 2, "description": 1}),
+    # Per-assignee and per-project change counters for ETags
+    VersionIndex("assigned_to"),
+    VersionIndex("project_id"),
+    # Tasks are held as slotted records and only become dicts when serialized
+    record_type=TaskRecord,
+)
+seed(tasks, {
     1: {
         "id": 1,
         "title": "Learn Flask Advanced Features",
@@ -83,26 +234,282 @@ tasks = {
         "completed_at": None,
         "tags": ["documentation", "work"]
     }
-}
+})
+
+# Session lifetimes (seconds) and the most sessions kept in memory at once
+SESSION_IDLE_TTL = 60 * 60
+SESSION_ABSOLUTE_TTL = 24 * 60 * 60
+SESSION_MAX_SIZE = 100_000
 
-sessions = {}
+sessions = SessionStore(idle_ttl=SESSION_IDLE_TTL, absolute_ttl=SESSION_ABSOLUTE_TTL,
+                        max_size=SESSION_MAX_SIZE)
+
+# AUTH_TOKEN_MODE=signed issues stateless HMAC tokens that any worker process
+# can verify; the default "session" mode keeps tokens in this process
+app.config['AUTH_TOKEN_MODE'] = os.environ.get('AUTH_TOKEN_MODE', 'session')
+revoked_tokens = storage.table("revoked_tokens", expiry_index())
+token_signer = TokenSigner(lambda: app.secret_key, ttl=SESSION_ABSOLUTE_TTL, revoked=revoked_tokens)
+
+def issue_token(user_id):
+    if app.config['AUTH_TOKEN_MODE'] == 'signed':
+        return token_signer.issue(user_id)
+    return sessions.create(user_id)
+
+def resolve_token(token):
+    if app.config['AUTH_TOKEN_MODE'] == 'signed':
+        return token_signer.verify(token)
+    return sessions.get(token)
+
+def revoke_token(token):
+    if app.config['AUTH_TOKEN_MODE'] == 'signed':
+        token_signer.revoke(token)
+    else:
+        sessions.revoke(token)
+
+def authenticate(token):
+    """Return ``(user, None)`` for a valid token, else ``(None, error message)``."""
+    user_id = resolve_token(token) if token else None
+    if user_id is None:
+        return None, "Authentication required"
+    
+    # Signed tokens cannot be revoked per user, so check the account itself
+    user = users.get(user_id)
+    if not user or not user.get('is_active', True):
+        return None, "Invalid session"
+    return user, None
 
 # Authentication decorator
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token or token not in sessions:
-            return jsonify({"error": "Authentication required"}), 401
+        user, error = authenticate(request.headers.get('Authorization'))
+        if error:
+            return jsonify({"error": error}), 401
         
-        user_id = sessions[token]
-        if user_id not in users:
-            return jsonify({"error": "Invalid session"}), 401
-        
-        request.current_user = users[user_id]
+        request.current_user = user
         return f(*args, **kwargs)
     return decorated_function
 
+# Conditional GET: ``version_of(user_id)`` names the table versions a response
+# depends on, so an unchanged resource is answered with 304 and no work
+def conditional_get(version_of):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_id = request.current_user['id']
+            state = (user_id, request.full_path, version_of(user_id))
+            etag = hashlib.sha1(repr(state).encode()).hexdigest()
+            # Weak comparison, since compression marks the ETag weak
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # The body depends on who is asking
+            response.vary.add('Authorization')
+            return response
+        return decorated_function
+    return decorator
+
+# Code holding several table locks takes them in the order users, tasks,
+# projects: new readers queue behind a waiting writer, so two threads nesting
+# the same locks the other way round can deadlock
+def task_list_version(user_id):
+    with tasks.lock.read():
+        return tasks.indexes['version_by_assigned_to'].version(user_id)
+
+def project_list_version(user_id):
+    # Task counts change with any task in the user's projects
+    with tasks.lock.read(), projects.lock.read():
+        project_ids = projects.indexes['owner_id'].lookup(user_id)
+        task_versions = tasks.indexes['version_by_project_id']
+        return (projects.indexes['version_by_owner_id'].version(user_id),
+                sum(task_versions.version(project_id) for project_id in project_ids))
+
+def profile_version(user_id):
+    with users.lock.read(), tasks.lock.read(), projects.lock.read():
+        return (users.indexes['version_by_id'].version(user_id),
+                tasks.indexes['version_by_assigned_to'].version(user_id),
+                projects.indexes['version_by_owner_id'].version(user_id))
+
+def dashboard_version(user_id):
+    # Overdue counts change with the clock as well as with writes
+    with tasks.lock.read(), projects.lock.read():
+        return (tasks.indexes['version_by_assigned_to'].version(user_id),
+                projects.indexes['version_by_owner_id'].version(user_id),
+                tasks.indexes['open_due_by_assigned_to'].count_before(user_id, time.time()))
+
+# Response compression for clients that send Accept-Encoding
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+COMPRESS_MIMETYPES = {"application/json", "application/x-ndjson", "text/html", "text/plain"}
+# zlib window bits selecting the gzip or zlib ("deflate") container
+COMPRESS_ENCODINGS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(COMPRESS_ENCODINGS)
+    if encoding is None:
+        return response
+    
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, COMPRESS_ENCODINGS[encoding])
+    if response.is_streamed:
+        # Streamed bodies are compressed chunk by chunk as they are sent
+        response.response = stream_compressed(response.response, compressor)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compressor.compress(body) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+    # The ETag names the uncompressed content, so it only matches weakly now
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def stream_compressed(chunks, compressor):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk)
+        # Flush each chunk so a streaming client is never left waiting on the buffer
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Field projection (?fields=id,title,...) for read endpoints
+TASK_FIELDS = TaskRecord.FIELDS
+PROJECT_FIELDS = ("id", "name", "description", "owner_id", "created_at", "status",
+                  "task_count", "task_status_counts")
+USER_FIELDS = ("id", "name", "email", "created_at", "is_active")
+
+def parse_fields(allowed):
+    """Return the fields named by ``?fields=``, or None when every field is wanted."""
+    fields = request.args.get('fields')
+    if fields is None:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if not fields or unknown:
+        raise ValueError(f"Invalid fields: {', '.join(unknown) or 'none given'}")
+    return fields
+
+def select_fields(record, fields):
+    # Builds only the requested keys, so compact records never become full dicts
+    selected = {}
+    for field in fields:
+        try:
+            selected[field] = record[field]
+        except KeyError:
+            pass
+    return selected
+
+# Keyset pagination and streaming for list endpoints
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+class Cursor:
+    """Keyset cursor for id-ordered listings: ``?after=`` is the last id seen."""
+    
+    def value(self, record):
+        return record['id']
+    
+    def parse(self, text):
+        return int(text)
+    
+    def format(self, value):
+        return str(value)
+
+class SortCursor(Cursor):
+    """Cursor for listings ordered by a sorted index: ``?after=<sort key>:<id>``."""
+    
+    def __init__(self, index):
+        self.index = index
+    
+    def value(self, record):
+        return (self.index.sort_key(record), record['id'])
+    
+    def parse(self, text):
+        key, pk = text.rsplit(':', 1)
+        return float(key), int(pk)
+    
+    def format(self, value):
+        return f"{value[0]!r}:{value[1]}"
+
+def list_response(fetch, transform=None, cursor=Cursor()):
+    """Build a list response from ``fetch(after, limit)``, a keyset record query.
+    
+    ``?limit=&after=`` returns one page (with a ``Link: rel="next"`` header when
+    more records remain) and ``?stream=ndjson|json`` writes the records in
+    bounded chunks instead of building the whole body in memory. ``cursor``
+    says what ``after`` holds; by default it is a record id.
+    """
+    transform = transform or (lambda record: record)
+    try:
+        after = request.args.get('after')
+        after = cursor.parse(after) if after is not None else None
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in STREAM_FORMATS:
+            return jsonify({"error": "Invalid stream format"}), 400
+        return Response(stream_records(fetch, after, limit, stream, transform, cursor),
+                        mimetype=STREAM_FORMATS[stream])
+    
+    if limit is None:
+        return jsonify([transform(record) for record in fetch(after, None)]), 200
+    
+    page = fetch(after, limit + 1)
+    response = jsonify([transform(record) for record in page[:limit]])
+    if len(page) > limit:
+        args = request.args.to_dict()
+        args['after'] = cursor.format(cursor.value(page[limit - 1]))
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+def stream_records(fetch, after, limit, fmt, transform, cursor):
+    # Each chunk is a fresh keyset query, so concurrent writes never invalidate
+    # an open iterator and at most one chunk is held in memory at a time
+    remaining = limit
+    separator = ''
+    if fmt == 'json':
+        yield '['
+    while remaining is None or remaining > 0:
+        size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+        chunk = fetch(after, size)
+        if not chunk:
+            break
+        bodies = [app.json.dumps(transform(record)) for record in chunk]
+        if fmt == 'ndjson':
+            yield '\n'.join(bodies) + '\n'
+        else:
+            yield separator + ','.join(bodies)
+            separator = ','
+        if len(chunk) < size:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        after = cursor.value(chunk[-1])
+    if fmt == 'json':
+        yield ']'
+
 # HTML Template for the dashboard
 DASHBOARD_TEMPLATE = """
 <!DOCTYPE html>
@@ -313,35 +720,50 @@ DASHBOARD_TEMPLATE = """
 """
 
 
+# Compiled once; the rendered page is reused until tasks or projects change
+dashboard_template = app.jinja_env.from_string(DASHBOARD_TEMPLATE)
+# A single (version, page) entry, swapped atomically so threads never pair a
+# version with another version's page
+dashboard_cache = {"entry": (None, None)}
+
 @app.route("/")
 def home():
-    # Calculate stats
-    total_tasks = len(tasks)
-    completed_tasks = len([t for t in tasks.values() if t['status'] == 'completed'])
-    pending_tasks = total_tasks - completed_tasks
-    total_projects = len(projects)
-    
-    # Get project data with task counts
-    project_data = []
-    for project in projects.values():
-        project_tasks = [t for t in tasks.values() if t['project_id'] == project['id']]
-        project_data.append({
-            **project,
-            'task_count': len(project_tasks)
-        })
+    # Read the versions before the data so a racing write can only make the
+    # cached page newer than its key, never older
+    version = (tasks.version, projects.version)
+    cached_version, cached_page = dashboard_cache["entry"]
+    if cached_version == version:
+        return cached_page
+    
+    with tasks.lock.read(), projects.lock.read():
+        # Calculate stats
+        total_tasks = len(tasks)
+        completed_tasks = tasks.count(status='completed')
+        pending_tasks = total_tasks - completed_tasks
+        total_projects = len(projects)
+    
+        # Get project data with task counts
+        project_data = []
+        for project in projects.values():
+            project_data.append({
+                **project,
+                'task_count': tasks.count(project_id=project['id'])
+            })
     
-    # Get recent tasks
-    recent_tasks = list(tasks.values())[:5]
+        # Get recent tasks
+        recent_tasks = list(islice(tasks.values(), 5))
     
-    return render_template_string(DASHBOARD_TEMPLATE, 
-                                stats={
-                                    'total_tasks': total_tasks,
-                                    'completed_tasks': completed_tasks,
-                                    'pending_tasks': pending_tasks,
-                                    'total_projects': total_projects
-                                },
-                                projects=project_data,
-                                tasks=recent_tasks)
+    page = render_template(dashboard_template,
+                           stats={
+                               'total_tasks': total_tasks,
+                               'completed_tasks': completed_tasks,
+                               'pending_tasks': pending_tasks,
+                               'total_projects': total_projects
+                           },
+                           projects=project_data,
+                           tasks=recent_tasks)
+    dashboard_cache["entry"] = (version, page)
+    return page
 
 # Authentication endpoints
 @app.route("/auth/login", methods=["POST"])
@@ -353,19 +775,21 @@ def login():
     if not email or not password:
         return jsonify({"error": "Email and password required"}), 400
     
+    # Only strings can be looked up in the email index
+    if not isinstance(email, str) or not isinstance(password, str):
+        return jsonify({"error": "Invalid credentials"}), 401
+    
     # Find user by email
-    user = None
-    for u in users.values():
-        if u['email'] == email:
-            user = u
-            break
+    user = users.get_by('email', email)
     
     if not user or user['password'] != hashlib.sha256(password.encode()).hexdigest():
         return jsonify({"error": "Invalid credentials"}), 401
     
+    if not user.get('is_active', True):
+        return jsonify({"error": "Account is inactive"}), 403
+    
     # Create session
-    token = str(uuid.uuid4())
-    sessions[token] = user['id']
+    token = issue_token(user['id'])
     
     return jsonify({
         "token": token,
@@ -379,18 +803,17 @@ def login():
 @app.route("/auth/logout", methods=["POST"])
 @require_auth
 def logout():
-    token = request.headers.get('Authorization')
-    if token in sessions:
-        del sessions[token]
+    revoke_token(request.headers.get('Authorization'))
     return jsonify({"message": "Logged out successfully"}), 200
 
 # Enhanced User endpoints
 @app.route("/users/profile", methods=["GET"])
 @require_auth
+@conditional_get(profile_version)
 def get_profile():
     user = request.current_user
-    user_tasks = [t for t in tasks.values() if t['assigned_to'] == user['id']]
-    user_projects = [p for p in projects.values() if p['owner_id'] == user['id']]
+    with tasks.lock.read():
+        status_counts = tasks.indexes['status_by_assigned_to'].counts(user['id'])
     
     return jsonify({
         "user": {
@@ -400,23 +823,22 @@ def get_profile():
             "created_at": user['created_at']
         },
         "stats": {
-            "total_tasks": len(user_tasks),
-            "completed_tasks": len([t for t in user_tasks if t['status'] == 'completed']),
-            "projects": len(user_projects)
+            "total_tasks": tasks.count(assigned_to=user['id']),
+            "completed_tasks": status_counts.get('completed', 0),
+            "projects": projects.count(owner_id=user['id'])
         }
     }), 200
 
 @app.route("/users/<int:user_id>", methods=["GET"])
 def get_user(user_id):
+    try:
+        fields = parse_fields(USER_FIELDS)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    
     user = users.get(user_id)
     if user:
-        return jsonify({
-            "id": user['id'],
-            "name": user['name'],
-            "email": user['email'],
-            "created_at": user['created_at'],
-            "is_active": user['is_active']
-        }), 200
+        return jsonify(select_fields(user, fields or USER_FIELDS)), 200
     return jsonify({"error": "User not found"}), 404
 
 @app.route("/users", methods=["POST"])
@@ -427,40 +849,59 @@ def create_user():
     if not data.get('name') or not data.get('email') or not data.get('password'):
         return jsonify({"error": "Name, email, and password are required"}), 400
     
-    # Check if email already exists
-    for user in users.values():
-        if user['email'] == data['email']:
-            return jsonify({"error": "Email already exists"}), 400
+    if not isinstance(data['email'], str):
+        return jsonify({"error": "Invalid email"}), 400
     
-    new_id = max(users.keys()) + 1 if users else 1
-    users[new_id] = {
-        "id": new_id,
-        "name": data['name'],
-        "email": data['email'],
-        "password": hashlib.sha256(data['password'].encode()).hexdigest(),
-        "created_at": datetime.now().isoformat(),
-        "is_active": True
-    }
+    with users.lock.write():
+        # Check if email already exists
+        if users.get_by('email', data['email']):
+            return jsonify({"error": "Email already exists"}), 400
+        
+        new_id = users.next_id()
+        user = users[new_id] = {
+            "id": new_id,
+            "name": data['name'],
+            "email": data['email'],
+            "password": hashlib.sha256(data['password'].encode()).hexdigest(),
+            "created_at": datetime.now().isoformat(),
+            "is_active": True
+        }
     
     return jsonify({
         "id": new_id,
         "name": data['name'],
         "email": data['email'],
-        "created_at": users[new_id]['created_at']
+        "created_at": user['created_at']
     }), 201
 
 # Project endpoints
 @app.route("/projects", methods=["GET"])
 @require_auth
+@conditional_get(project_list_version)
 def get_projects():
     user_id = request.current_user['id']
-    user_projects = [p for p in projects.values() if p['owner_id'] == user_id]
+    try:
+        fields = parse_fields(PROJECT_FIELDS)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    
+    def fetch(after, limit):
+        return projects.page({"owner_id": user_id}, after, limit)
     
-    # Add task counts to projects
-    for project in user_projects:
-        project['task_count'] = len([t for t in tasks.values() if t['project_id'] == project['id']])
+    # Task counts per project and status are maintained by the task table, so
+    # each project costs one lookup; the stored project is never modified
+    def with_task_count(project):
+        result = dict(project) if fields is None else select_fields(project, fields)
+        if fields is None or 'task_count' in fields or 'task_status_counts' in fields:
+            with tasks.lock.read():
+                status_counts = tasks.indexes['status_by_project_id'].counts(project['id'])
+            if fields is None or 'task_count' in fields:
+                result['task_count'] = sum(status_counts.values())
+            if fields is None or 'task_status_counts' in fields:
+                result['task_status_counts'] = status_counts
+        return result
     
-    return jsonify(user_projects), 200
+    return list_response(fetch, with_task_count)
 
 @app.route("/projects", methods=["POST"])
 @require_auth
@@ -471,8 +912,8 @@ def create_project():
     if not data.get('name'):
         return jsonify({"error": "Project name is required"}), 400
     
-    new_id = max(projects.keys()) + 1 if projects else 1
-    projects[new_id] = {
+    new_id = projects.next_id()
+    project = projects[new_id] = {
         "id": new_id,
         "name": data['name'],
         "description": data.get('description', ''),
@@ -480,33 +921,51 @@ def create_project():
         "created_at": datetime.now().isoformat(),
         "status": "active"
     }
+    queue_event("project.created", project, [user_id])
     
-    return jsonify(projects[new_id]), 201
+    return jsonify(project), 201
 
 @app.route("/projects/<int:project_id>", methods=["PUT"])
 @require_auth
 def update_project(project_id):
     user_id = request.current_user['id']
-    project = projects.get(project_id)
-    
-    if not project:
-        return jsonify({"error": "Project not found"}), 404
-    
-    if project['owner_id'] != user_id:
-        return jsonify({"error": "Not authorized"}), 403
-    
     data = request.json
-    project.update({
-        "name": data.get('name', project['name']),
-        "description": data.get('description', project['description']),
-        "status": data.get('status', project['status'])
-    })
+    
+    with projects.lock.write():
+        project = projects.get(project_id)
+        
+        if not project:
+            return jsonify({"error": "Project not found"}), 404
+        
+        if project['owner_id'] != user_id:
+            return jsonify({"error": "Not authorized"}), 403
+        
+        project = projects.patch(project_id, {
+            "name": data.get('name', project['name']),
+            "description": data.get('description', project['description']),
+            "status": data.get('status', project['status'])
+        })
+    queue_event("project.updated", project, [user_id])
     
     return jsonify(project), 200
 
 # Task endpoints
+SORT_INDEXES = {
+    "due_date": "due_by_assigned_to",
+    "created_at": "created_by_assigned_to",
+    "completed_at": "completed_by_assigned_to",
+    "priority": "priority_rank_by_assigned_to",
+}
+# ?<name>_after=&<name>_before= date range filters
+RANGE_INDEXES = {
+    "due": "due_by_assigned_to",
+    "created": "created_by_assigned_to",
+    "completed": "completed_by_assigned_to",
+}
+
 @app.route("/tasks", methods=["GET"])
 @require_auth
+@conditional_get(task_list_version)
 def get_tasks():
     user_id = request.current_user['id']
     
@@ -514,39 +973,166 @@ def get_tasks():
     project_id = request.args.get('project_id', type=int)
     status = request.args.get('status')
     priority = request.args.get('priority')
+    ranges = {}
+    for name, index_name in RANGE_INDEXES.items():
+        try:
+            low = parse_timestamp(request.args.get(f'{name}_after'))
+            high = parse_timestamp(request.args.get(f'{name}_before'))
+        except ValueError:
+            return jsonify({"error": f"Invalid {name} date"}), 400
+        if low is not None or high is not None:
+            # Tasks without the date sort last, so an open range must stop short of them
+            ranges[index_name] = (low, SORT_LAST if high is None else high)
+    sort = request.args.get('sort')
+    if sort is not None and sort not in SORT_INDEXES:
+        return jsonify({"error": f"sort must be one of: {', '.join(SORT_INDEXES)}"}), 400
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "order must be 'asc' or 'desc'"}), 400
+    try:
+        fields = parse_fields(TASK_FIELDS)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    # ?tag=a&tag=b (or ?tag=a,b) matches any of the tags, or all with ?tag_match=all
+    tags = [tag for value in request.args.getlist('tag') for tag in value.split(',') if tag]
+    tag_match = request.args.get('tag_match', 'any')
+    if tag_match not in ('any', 'all'):
+        return jsonify({"error": "tag_match must be 'any' or 'all'"}), 400
     
-    # Get tasks assigned to user
-    user_tasks = [t for t in tasks.values() if t['assigned_to'] == user_id]
-    
-    # Apply filters
+    # Get tasks assigned to user, narrowed by the secondary indexes
+    criteria = {"assigned_to": user_id}
     if project_id:
-        user_tasks = [t for t in user_tasks if t['project_id'] == project_id]
+        criteria["project_id"] = project_id
     if status:
-        user_tasks = [t for t in user_tasks if t['status'] == status]
+        criteria["status"] = status
     if priority:
-        user_tasks = [t for t in user_tasks if t['priority'] == priority]
+        criteria["priority"] = priority
+    
+    # Date ranges (except one on the sort key) and tags each narrow a set of ids
+    sort_index = SORT_INDEXES.get(sort)
+    ids = None
+    with tasks.lock.read():
+        for index_name, (low, high) in ranges.items():
+            if index_name != sort_index:
+                matched = set(tasks.indexes[index_name].range(user_id, low, high))
+                ids = matched if ids is None else ids & matched
+        if tags:
+            buckets = [tasks.indexes['tags_by_assigned_to'].lookup(user_id, tag) for tag in tags]
+            if tag_match == 'all':
+                tagged = set(buckets[0]).intersection(*buckets[1:])
+            else:
+                tagged = set().union(*buckets)
+            ids = tagged if ids is None else ids & tagged
+    
+    cursor = Cursor()
+    if sort_index is not None:
+        # Walk the sort index from the cursor, so a page touches about as many
+        # records as it returns (plus any the other filters reject)
+        index = tasks.indexes[sort_index]
+        low, high = ranges.get(sort_index, (None, None))
+        cursor = SortCursor(index)
+        
+        def fetch(after, limit):
+            with tasks.lock.read():
+                pks = index.range(user_id, low, high, reverse=order == 'desc', start=after)
+                if ids is not None:
+                    pks = (pk for pk in pks if pk in ids)
+                return tasks.filter(pks, criteria, limit)
+    elif ids is not None:
+        ids = sorted(ids)
+        
+        def fetch(after, limit):
+            start = 0 if after is None else bisect_right(ids, after)
+            return tasks.filter(islice(ids, start, None), criteria, limit)
+    else:
+        def fetch(after, limit):
+            return tasks.page(criteria, after, limit)
     
-    return jsonify(user_tasks), 200
+    transform = None if fields is None else lambda task: select_fields(task, fields)
+    return list_response(fetch, transform, cursor)
 
-@app.route("/tasks", methods=["POST"])
+@app.route("/tags", methods=["GET"])
 @require_auth
-def create_task():
-    data = request.json
+@conditional_get(task_list_version)
+def get_tags():
+    user_id = request.current_user['id']
+    # Tag counts over the caller's tasks, maintained by the task table
+    with tasks.lock.read():
+        tag_counts = tasks.indexes['tags_by_assigned_to'].counts(user_id)
+    return jsonify(tag_counts), 200
+
+SEARCH_DEFAULT_LIMIT = 50
+
+@app.route("/tasks/search", methods=["GET"])
+@require_auth
+def search_tasks():
     user_id = request.current_user['id']
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Search query is required"}), 400
+    limit = request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    try:
+        fields = parse_fields(TASK_FIELDS)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
     
-    if not data.get('title'):
-        return jsonify({"error": "Task title is required"}), 400
+    # Only tasks the user may see: assigned to them or created by them
+    with tasks.lock.read():
+        visible = set(tasks.indexes['assigned_to'].lookup(user_id))
+        visible.update(tasks.indexes['created_by'].lookup(user_id))
+        ranked = tasks.indexes['text'].search(query, candidates=visible, limit=limit)
+        results = tasks.filter([pk for pk, _ in ranked], {})
     
+    if fields is not None:
+        results = [select_fields(task, fields) for task in results]
+    return jsonify(results), 200
+
+# Task write rules, shared by the single-task endpoints and the batch endpoint.
+# Each returns a (body, status) pair.
+def task_audience(*records):
+    """Return the assignees, creators and project owners of these task versions."""
+    user_ids = set()
+    for task in records:
+        user_ids.update((task['assigned_to'], task['created_by']))
+        project = projects.get(task['project_id']) if task.get('project_id') else None
+        if project:
+            user_ids.add(project['owner_id'])
+    return user_ids
+
+def task_field_error(data):
+    """Return the error for a task field of the wrong type in ``data``, or None."""
+    for field in ('priority', 'status'):
+        if field in data and not isinstance(data[field], str):
+            return f"Invalid {field}"
+    if 'assigned_to' in data and type(data['assigned_to']) is not int:
+        return "Invalid assignee"
+    tags = data.get('tags', [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        return "Tags must be a list of strings"
     project_id = data.get('project_id')
-    if project_id and project_id not in projects:
-        return jsonify({"error": "Invalid project"}), 400
+    if project_id and (type(project_id) is not int or project_id not in projects):
+        return "Invalid project"
+    return None
+
+def apply_task_create(user_id, data):
+    if not data.get('title'):
+        return {"error": "Task title is required"}, 400
+    
+    error = task_field_error(data)
+    if error:
+        return {"error": error}, 400
+    
+    if not is_valid_timestamp(data.get('due_date')):
+        return {"error": "Invalid due date"}, 400
     
-    new_id = max(tasks.keys()) + 1 if tasks else 1
-    tasks[new_id] = {
+    new_id = tasks.next_id()
+    task = tasks[new_id] = {
         "id": new_id,
         "title": data['title'],
         "description": data.get('description', ''),
-        "project_id": project_id,
+        "project_id": data.get('project_id'),
         "assigned_to": data.get('assigned_to', user_id),
         "created_by": user_id,
         "priority": data.get('priority', 'medium'),
@@ -556,105 +1142,242 @@ def create_task():
         "completed_at": None,
         "tags": data.get('tags', [])
     }
+    queue_event("task.created", task, task_audience(task))
     
-    return jsonify(tasks[new_id]), 201
+    return task, 201
+
+def apply_task_update(user_id, task_id, data):
+    error = task_field_error(data)
+    if error:
+        return {"error": error}, 400
+    
+    # The dates are parsed by the sorted indexes
+    for field in ('due_date', 'created_at', 'completed_at'):
+        if not is_valid_timestamp(data.get(field)):
+            return {"error": f"Invalid {field.replace('_', ' ')}"}, 400
+    
+    # Hold the write lock so the checks below still hold when the patch lands
+    with tasks.lock.write():
+        task = tasks.get(task_id)
+        
+        if not task:
+            return {"error": "Task not found"}, 404
+        
+        if task['assigned_to'] != user_id and task['created_by'] != user_id:
+            return {"error": "Not authorized"}, 403
+        
+        # If marking as completed, set completion time
+        if data.get('status') == 'completed' and task['status'] != 'completed':
+            data['completed_at'] = datetime.now().isoformat()
+        
+        updated = tasks.patch(task_id, data)
+    # Whoever could see the task before the change hears about it too
+    queue_event("task.updated", updated, task_audience(task, updated))
+    return updated, 200
+
+def apply_task_delete(user_id, task_id):
+    with tasks.lock.write():
+        task = tasks.get(task_id)
+        
+        if not task:
+            return {"error": "Task not found"}, 404
+        
+        if task['created_by'] != user_id:
+            return {"error": "Not authorized"}, 403
+        
+        tasks.pop(task_id)
+    queue_event("task.deleted", task, task_audience(task))
+    return task, 200
+
+@app.route("/tasks", methods=["POST"])
+@require_auth
+def create_task():
+    body, status = apply_task_create(request.current_user['id'], request.json)
+    return jsonify(body), status
 
 @app.route("/tasks/<int:task_id>", methods=["PUT"])
 @require_auth
 def update_task(task_id):
-    user_id = request.current_user['id']
-    task = tasks.get(task_id)
-    
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
-    
-    if task['assigned_to'] != user_id and task['created_by'] != user_id:
-        return jsonify({"error": "Not authorized"}), 403
-    
-    data = request.json
-    
-    # If marking as completed, set completion time
-    if data.get('status') == 'completed' and task['status'] != 'completed':
-        data['completed_at'] = datetime.now().isoformat()
-    
-    task.update(data)
-    return jsonify(task), 200
+    body, status = apply_task_update(request.current_user['id'], task_id, request.json)
+    return jsonify(body), status
 
 @app.route("/tasks/<int:task_id>", methods=["DELETE"])
 @require_auth
 def delete_task(task_id):
+    body, status = apply_task_delete(request.current_user['id'], task_id)
+    return jsonify(body), status
+
+MAX_BATCH_SIZE = 1000
+
+@app.route("/tasks/batch", methods=["POST"])
+@require_auth
+def batch_tasks():
+    """Apply a list of create/update/delete operations in one request.
+    
+    Body: ``{"operations": [{"op": "create", "data": {...}},
+    {"op": "update", "id": 1, "data": {...}}, {"op": "delete", "id": 2}],
+    "atomic": false}``. Each operation gets the same validation and
+    authorization as its single-task endpoint. With ``atomic`` set, the first
+    failure rolls back every operation already applied.
+    """
+    data = request.json
     user_id = request.current_user['id']
-    task = tasks.get(task_id)
+    operations = data.get('operations')
+    atomic = bool(data.get('atomic', False))
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} operations per batch"}), 400
     
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
+    results = []
+    undo = []  # (task_id, record before the operation or None)
+    committed = True
+    # An atomic batch keeps the write lock so no other request sees it half-applied
+    with tasks.lock.write() if atomic else nullcontext():
+        for operation in operations:
+            body, status = apply_batch_operation(user_id, operation, undo)
+            results.append({"status": status, "body": body})
+            if atomic and status >= 400:
+                for task_id, previous in reversed(undo):
+                    if previous is None:
+                        tasks.pop(task_id, None)
+                    else:
+                        tasks[task_id] = previous
+                for result in results[:-1]:
+                    result.update(status=409, body={"error": "Rolled back"})
+                committed = False
+                break
+    
+    return jsonify({"results": results, "committed": committed}), 200 if committed else 400
+
+def apply_batch_operation(user_id, operation, undo):
+    if not isinstance(operation, dict):
+        return {"error": "Invalid operation"}, 400
+    op = operation.get('op')
+    data = operation.get('data', {})
+    task_id = operation.get('id')
+    if op != 'create' and not isinstance(task_id, int):
+        return {"error": "Task id is required"}, 400
+    if not isinstance(data, dict):
+        return {"error": "Invalid operation"}, 400
     
-    if task['created_by'] != user_id:
-        return jsonify({"error": "Not authorized"}), 403
+    if op == 'create':
+        body, status = apply_task_create(user_id, data)
+        if status < 400:
+            undo.append((body['id'], None))
+        return body, status
     
-    deleted_task = tasks.pop(task_id)
-    return jsonify(deleted_task), 200
+    previous = tasks.get(task_id)
+    if op == 'update':
+        body, status = apply_task_update(user_id, task_id, data)
+    elif op == 'delete':
+        body, status = apply_task_delete(user_id, task_id)
+    else:
+        return {"error": "Invalid operation"}, 400
+    if status < 400:
+        undo.append((task_id, previous))
+    return body, status
 
 # Analytics endpoints
 @app.route("/analytics/dashboard", methods=["GET"])
 @require_auth
+@conditional_get(dashboard_version)
 def get_dashboard_analytics():
     user_id = request.current_user['id']
-    user_tasks = [t for t in tasks.values() if t['assigned_to'] == user_id]
-    user_projects = [p for p in projects.values() if p['owner_id'] == user_id]
-    
-    # Task status distribution
-    status_counts = {}
-    for task in user_tasks:
-        status = task['status']
-        status_counts[status] = status_counts.get(status, 0) + 1
-    
-    # Priority distribution
-    priority_counts = {}
-    for task in user_tasks:
-        priority = task['priority']
-        priority_counts[priority] = priority_counts.get(priority, 0) + 1
-    
-    # Overdue tasks
-    overdue_tasks = []
-    for task in user_tasks:
-        if task['due_date'] and task['status'] != 'completed':
-            due_date = datetime.fromisoformat(task['due_date'])
-            if due_date < datetime.now():
-                overdue_tasks.append(task)
+    
+    # Status and priority distributions are maintained by the task table
+    with tasks.lock.read():
+        status_counts = tasks.indexes['status_by_assigned_to'].counts(user_id)
+        priority_counts = tasks.indexes['priority_by_assigned_to'].counts(user_id)
+        total_tasks = tasks.count(assigned_to=user_id)
+        
+        # Overdue tasks are the open ones due before now in the sorted due-date index
+        overdue_tasks = tasks.indexes['open_due_by_assigned_to'].count_before(user_id, time.time())
     
     return jsonify({
-        "total_tasks": len(user_tasks),
-        "total_projects": len(user_projects),
+        "total_tasks": total_tasks,
+        "total_projects": projects.count(owner_id=user_id),
         "status_distribution": status_counts,
         "priority_distribution": priority_counts,
-        "overdue_tasks": len(overdue_tasks),
-        "completion_rate": len([t for t in user_tasks if t['status'] == 'completed']) / len(user_tasks) * 100 if user_tasks else 0
+        "overdue_tasks": overdue_tasks,
+        "completion_rate": status_counts.get('completed', 0) / total_tasks * 100 if total_tasks else 0
     }), 200
 
+# Change feed
+# Seconds between keepalive comments on an idle stream
+EVENTS_KEEPALIVE = 15
+
+@app.route("/events", methods=["GET"])
+@require_auth
+def get_events():
+    """Stream the caller's task and project changes as Server-Sent Events.
+    
+    Events are ``task.created``, ``task.updated``, ``task.deleted``,
+    ``project.created`` and ``project.updated`` with the record as data. A
+    reconnecting client sends ``Last-Event-ID`` to receive what it missed; a
+    ``reset`` event means some were lost and the client should refetch.
+    """
+    token = request.headers.get('Authorization')
+    subscription = event_hub.subscribe(request.current_user['id'], request.headers.get('Last-Event-ID'))
+    
+    def stream():
+        # Sent at once so the client knows the subscription is live
+        yield STREAM_PREAMBLE
+        while not subscription.closed:
+            events = subscription.wait(EVENTS_KEEPALIVE)
+            # Stop once the token is revoked or the account deactivated, or
+            # the hub is shutting down
+            if subscription.closed or authenticate(token)[1]:
+                return
+            yield encode_events(events)
+    
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Ask proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(subscription.close)
+    return response
+
 # Legacy user endpoints (for backward compatibility)
 @app.route("/users/<int:user_id>", methods=["PUT"])
 def update_user(user_id):
     data = request.json
-    if user_id not in users:
-        return jsonify({"error": "User not found"}), 404
     
     # Don't allow password updates through this endpoint
     if 'password' in data:
         del data['password']
     
-    users[user_id].update(data)
+    if 'email' in data and not isinstance(data['email'], str):
+        return jsonify({"error": "Invalid email"}), 400
+    
+    with users.lock.write():
+        if user_id not in users:
+            return jsonify({"error": "User not found"}), 404
+        
+        if 'email' in data:
+            owner = users.get_by('email', data['email'])
+            if owner and owner['id'] != user_id:
+                return jsonify({"error": "Email already exists"}), 400
+        
+        user = users.patch(user_id, data)
+    
+    # Deactivating an account ends all of its sessions at once
+    if not user.get('is_active', True):
+        sessions.revoke_user(user_id)
+    
     return jsonify({
-        "id": users[user_id]['id'],
-        "name": users[user_id]['name'],
-        "email": users[user_id]['email'],
-        "created_at": users[user_id]['created_at']
+        "id": user['id'],
+        "name": user['name'],
+        "email": user['email'],
+        "created_at": user['created_at']
     }), 200
 
 @app.route("/users/<int:user_id>", methods=["DELETE"])
 def delete_user(user_id):
-    if user_id in users:
-        deleted = users.pop(user_id)
+    deleted = users.pop(user_id, None)
+    if deleted:
+        sessions.revoke_user(user_id)
         return jsonify({
             "id": deleted['id'],
             "name": deleted['name'],
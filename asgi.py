@@ -0,0 +1,214 @@
+"""ASGI entry point, for serving many long-lived connections from one process.
+
+    pip install uvicorn
+    uvicorn asgi:app
+
+GET /events runs on the event loop: an idle subscriber is a suspended
+coroutine that the event hub wakes, not a blocked thread, so thousands of open
+feeds fit on one core. Every other request is handed to the Flask app on a
+thread pool, so the handlers, their validation and the store are the ones the
+WSGI server runs. A streamed body (GET /tasks?stream=...) goes back to the
+pool once per chunk and holds no thread while the client catches up.
+"""
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as api
+from events import STREAM_PREAMBLE, encode_events
+
+# Threads running Flask handlers; long-lived connections do not occupy one
+THREADS = 32
+
+executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="asgi-wsgi")
+
+
+def header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI carries the raw path bytes as latin-1 text
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        # The whole body is buffered, so it can be read to the end even
+        # without a Content-Length (a chunked upload)
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    """Run the Flask app; return (status, headers, body, stream).
+
+    A response with a Content-Length is read here in full and ``stream`` is
+    None; otherwise ``stream`` is the ``(result, iterator)`` to pull chunks from.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]),
+                      [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]]
+
+    result = api.app(environ, start_response)
+    chunks = iter(result)
+    status, headers = started
+    if any(name == b"content-length" for name, _ in headers):
+        try:
+            return status, headers, b"".join(chunks), None
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+    return status, headers, b"", (result, chunks)
+
+
+async def read_body(receive):
+    """Return the request body, or None if the client went away first."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def run_wsgi(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    status, headers, content, stream = await loop.run_in_executor(
+        executor, call_wsgi, wsgi_environ(scope, body))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    if stream is None:
+        await send({"type": "http.response.body", "body": content})
+        return
+    result, chunks = stream
+    try:
+        while (chunk := await loop.run_in_executor(executor, next, chunks, None)) is not None:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await loop.run_in_executor(executor, result.close)
+
+
+async def send_json(send, status, body):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+
+async def stream_events(scope, receive, send):
+    """GET /events, as in ``app.get_events`` but without a thread per subscriber."""
+    loop = asyncio.get_running_loop()
+    token = header(scope, b"authorization")
+    user, error = await loop.run_in_executor(executor, api.authenticate, token)
+    if error:
+        await send_json(send, 401, {"error": error})
+        return
+
+    subscription = api.event_hub.subscribe(user["id"], header(scope, b"last-event-id"))
+    ready = asyncio.Event()
+    subscription.waker = lambda: loop.call_soon_threadsafe(ready.set)
+    disconnected = idle = False
+
+    def keepalive():
+        nonlocal idle
+        idle = True
+        ready.set()
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected = True
+        ready.set()
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body", "body": STREAM_PREAMBLE.encode(), "more_body": True})
+        # Replayed events are already buffered
+        ready.set()
+        while True:
+            # A plain timer rather than wait_for, which costs a task per wakeup
+            timer = loop.call_later(api.EVENTS_KEEPALIVE, keepalive)
+            await ready.wait()
+            timer.cancel()
+            if disconnected:
+                return
+            if subscription.closed:
+                break
+            ready.clear()
+            events = subscription.wait(0)
+            if idle:
+                # Stop once the token is revoked or the account deactivated;
+                # checked at each keepalive so fan-out stays on the loop
+                _, error = await loop.run_in_executor(executor, api.authenticate, token)
+                if error:
+                    break
+                idle = False
+            elif not events:
+                continue
+            await send({"type": "http.response.body", "body": encode_events(events).encode(),
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        subscription.close()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http":
+        if scope["method"] == "GET" and scope["path"] == "/events":
+            await stream_events(scope, receive, send)
+        else:
+            await run_wsgi(scope, receive, send)
@@ -0,0 +1,128 @@
+"""Load test: thousands of idle GET /events subscribers, threaded WSGI vs ASGI.
+
+Starts the app under Flask's threaded server and under uvicorn (``asgi:app``,
+one process), opens N event streams against each, and reports what holding
+them costs the server and how fast one task write reaches every subscriber.
+It also times ordinary requests made while the streams are open.
+
+    pip install uvicorn
+    python benchmarks/bench_asgi.py            # 2,000 subscribers
+    python benchmarks/bench_asgi.py 5000
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = "127.0.0.1"
+REQUESTS = 200
+# Connections being opened at any one time
+CONNECTING = 100
+
+SERVERS = {
+    "threaded WSGI": [sys.executable, "-c",
+                      "import sys, app; app.app.run(host=sys.argv[1], port=int(sys.argv[2]), threaded=True)"],
+    "ASGI (uvicorn)": [sys.executable, "-m", "uvicorn", "asgi:app", "--log-level", "warning",
+                       "--host", "{host}", "--port", "{port}"],
+}
+
+
+def call(port, method, path, token=None, body=None):
+    request = urllib.request.Request(f"http://{HOST}:{port}{path}", method=method,
+                                     data=None if body is None else json.dumps(body).encode())
+    request.add_header("Content-Type", "application/json")
+    if token:
+        request.add_header("Authorization", token)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def start(command, port):
+    if "{port}" in command:
+        command = [part.format(host=HOST, port=port) for part in command]
+    else:
+        command = command + [HOST, str(port)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            call(port, "GET", "/tags")
+        except urllib.error.HTTPError:
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{command[2]} did not start")
+
+
+def server_usage(pid):
+    with open(f"/proc/{pid}/status") as status:
+        fields = dict(line.split(":", 1) for line in status)
+    with open(f"/proc/{pid}/stat") as stat:
+        ticks = sum(map(int, stat.read().rsplit(")", 1)[1].split()[11:13]))
+    return int(fields["Threads"]), int(fields["VmRSS"].split()[0]) / 1024, ticks / os.sysconf("SC_CLK_TCK")
+
+
+async def subscribe(port, token, pending):
+    # Connects are staggered so they never overflow the listen backlog
+    async with pending:
+        reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(f"GET /events HTTP/1.1\r\nHost: {HOST}\r\nAuthorization: {token}\r\n\r\n".encode())
+        await reader.readuntil(b": subscribed\n\n")
+    return reader, writer
+
+
+async def run(port, token, count):
+    start = time.perf_counter()
+    pending = asyncio.Semaphore(CONNECTING)
+    streams = await asyncio.gather(*(subscribe(port, token, pending) for _ in range(count)))
+    connect = time.perf_counter() - start
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await loop.run_in_executor(None, call, port, "GET", "/tasks?limit=10&fields=id", token)
+    request = (time.perf_counter() - start) / REQUESTS
+
+    start = time.perf_counter()
+    write = loop.run_in_executor(None, call, port, "POST", "/tasks", token, {"title": "Fan-out"})
+    await asyncio.gather(*(reader.readuntil(b"event: task.created") for reader, _ in streams))
+    fan_out = time.perf_counter() - start
+    await write
+
+    for _, writer in streams:
+        writer.close()
+    return connect, request, fan_out
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    print(f"{count:,} idle GET /events subscribers, {os.cpu_count()} CPU(s)")
+    for port, (name, command) in enumerate(SERVERS.items(), start=5100):
+        if "uvicorn" in command:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                print(f"  {name}: uvicorn is not installed, skipped")
+                continue
+        process = start(command, port)
+        try:
+            token = call(port, "POST", "/auth/login", body={
+                "email": "pradnya@example.com", "password": "password123"})["token"]
+            _, _, cpu_before = server_usage(process.pid)
+            connect, request, fan_out = asyncio.run(run(port, token, count))
+            threads, rss, cpu_after = server_usage(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"  {name:15} connect all {connect:6.2f} s  GET /tasks {request * 1000:6.2f} ms  "
+              f"fan-out {fan_out * 1000:7.1f} ms  {threads:5} threads  {rss:6.1f} MiB  "
+              f"server CPU {cpu_after - cpu_before:5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measure GET /tasks at 10,000 tasks: encoder time and bytes on the wire.
+
+Runs the request through the Flask test client once per JSON encoder (orjson
+when installed, then the stdlib) and per Accept-Encoding.
+
+    python benchmarks/bench_json.py            # 10,000 tasks
+    python benchmarks/bench_json.py 100000
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import app, tasks
+
+STATUSES = ["todo", "in_progress", "completed"]
+PRIORITIES = ["low", "medium", "high"]
+TAGS = ["work", "personal", "urgent", "learning", "documentation"]
+ROUNDS = 5
+
+
+def load_tasks(count):
+    now = datetime.now()
+    tasks.clear()
+    tasks.update({pk: {
+        "id": pk,
+        "title": f"Task {pk}",
+        "description": "Generated for the JSON benchmark",
+        "project_id": 1,
+        "assigned_to": 1,
+        "created_by": 1,
+        "priority": PRIORITIES[pk % 3],
+        "status": STATUSES[pk % 3],
+        "due_date": (now + timedelta(days=pk % 30)).isoformat(),
+        "created_at": now.isoformat(),
+        "completed_at": now.isoformat() if pk % 3 == 2 else None,
+        "tags": TAGS[pk % 5:pk % 5 + 2],
+    } for pk in range(1, count + 1)})
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def best_time(client, headers):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        response = client.get('/tasks', headers=headers)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(response.data)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    load_tasks(count)
+    client = app.test_client()
+    token = client.post('/auth/login', json={
+        'email': 'pradnya@example.com', 'password': 'password123'}).get_json()['token']
+
+    encoders = [("orjson", app_module.orjson), ("stdlib", None)]
+    if app_module.orjson is None:
+        print("orjson is not installed; measuring the stdlib encoder only")
+        encoders = encoders[1:]
+
+    print(f"GET /tasks, {count:,} tasks (best of {ROUNDS})")
+    for name, module in encoders:
+        app_module.orjson = module
+        with app.app_context():
+            records = list(tasks.values())
+            encode = min(timed(app.json.response, records) for _ in range(ROUNDS))
+        print(f"  {name}: encode {encode * 1000:7.1f} ms")
+        for encoding in ("identity", "gzip", "deflate"):
+            elapsed, size = best_time(client, {'Authorization': token, 'Accept-Encoding': encoding})
+            print(f"    {encoding:8}  request {elapsed * 1000:7.1f} ms  {size / 1024:8.1f} KiB on the wire")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare the memory cost of plain task dicts and compact TaskRecords.
+
+Tasks are decoded from JSON one at a time, as create_task receives them, so
+every dict holds its own copies of the repeated strings.
+
+    python benchmarks/bench_memory.py            # 100,000 tasks
+    python benchmarks/bench_memory.py 1000000
+"""
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import TaskRecord
+
+STATUSES = ["todo", "in_progress", "completed"]
+PRIORITIES = ["low", "medium", "high"]
+TAGS = ["work", "personal", "urgent", "learning", "documentation"]
+
+
+def task_payloads(count):
+    now = datetime.now()
+    for pk in range(1, count + 1):
+        yield json.dumps({
+            "id": pk,
+            "title": f"Task {pk}",
+            "description": "Generated for the memory benchmark",
+            "project_id": pk % 50,
+            "assigned_to": pk % 1000,
+            "created_by": pk % 1000,
+            "priority": PRIORITIES[pk % 3],
+            "status": STATUSES[pk % 3],
+            "due_date": (now + timedelta(days=pk % 30)).isoformat(),
+            "created_at": now.isoformat(),
+            "completed_at": now.isoformat() if pk % 3 == 2 else None,
+            "tags": TAGS[pk % 5:pk % 5 + 2],
+        })
+
+
+def measure(count, build):
+    tracemalloc.start()
+    rows = [build(json.loads(payload)) for payload in task_payloads(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    dict_bytes = measure(count, lambda task: task)
+    record_bytes = measure(count, TaskRecord)
+    print(f"{count:,} tasks")
+    print(f"  dict:       {dict_bytes / 2**20:8.1f} MiB  ({dict_bytes / count:6.0f} B/task)")
+    print(f"  TaskRecord: {record_bytes / 2**20:8.1f} MiB  ({record_bytes / count:6.0f} B/task)")
+    print(f"  saving:     {1 - record_bytes / dict_bytes:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
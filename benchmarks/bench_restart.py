@@ -0,0 +1,91 @@
+"""Measure how long the app takes to come back up on the write-ahead log.
+
+Fills a wal:// directory with tasks, then times a fresh ``import app`` (which
+restores every table) in two layouts: a snapshot plus a short log tail, and
+the whole history as log entries only.
+
+    python benchmarks/bench_restart.py            # 1,000,000 tasks
+    python benchmarks/bench_restart.py 100000
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAIL = 10_000
+
+FILL = """
+import sys
+from datetime import datetime, timedelta
+import app
+count, tail, snapshot = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3] == "1"
+statuses = ["todo", "in_progress", "completed"]
+priorities = ["low", "medium", "high"]
+tags = ["work", "personal", "urgent", "learning", "documentation"]
+now = datetime.now()
+
+def task(pk):
+    return {
+        "id": pk,
+        "title": f"Task {pk}",
+        "description": "Generated for the restart benchmark",
+        "project_id": pk % 50 + 1,
+        "assigned_to": pk % 1000 + 1,
+        "created_by": pk % 1000 + 1,
+        "priority": priorities[pk % 3],
+        "status": statuses[pk % 3],
+        "due_date": (now + timedelta(days=pk % 30)).isoformat(),
+        "created_at": now.isoformat(),
+        "completed_at": now.isoformat() if pk % 3 == 2 else None,
+        "tags": tags[pk % 5:pk % 5 + 2],
+    }
+
+for start in range(1, count + 1, 10_000):
+    app.tasks.update({pk: task(pk) for pk in range(start, min(start + 10_000, count + 1))})
+    app.storage.commit()
+if snapshot:
+    app.storage.snapshot()
+for pk in range(1, tail + 1):
+    app.tasks.patch(pk, {"status": "completed"})
+app.storage.commit()
+"""
+
+RESTART = """
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start, len(app.tasks))
+"""
+
+
+def run(code, directory, *args):
+    env = dict(os.environ, STORAGE_URL=f"wal:///{directory}")
+    # Only the snapshot taken on purpose
+    env["WAL_SNAPSHOT_EVERY"] = "0"
+    result = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True)
+    return result.stdout
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(path, name))
+               for path, _, names in os.walk(directory) for name in names)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Restart with {count:,} tasks and a {TAIL:,}-write tail")
+    for label, snapshot in (("snapshot + tail", "1"), ("log only", "0")):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            run(FILL, directory, str(count), str(TAIL), snapshot)
+            fill = time.perf_counter() - start
+            elapsed, loaded = run(RESTART, directory).split()
+            print(f"  {label:16} restart {float(elapsed):6.2f} s  {int(loaded):,} tasks  "
+                  f"{directory_size(directory) / 2**20:7.1f} MiB on disk  (fill {fill:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""In-process change feed behind GET /events (Server-Sent Events).
+
+Every published event is delivered to the subscriptions of the users it names
+and kept in a bounded history, so a client reconnecting with ``Last-Event-ID``
+gets what it missed. A subscriber whose buffer fills up, or whose last id is
+no longer in the history, gets a single ``reset`` event instead: refetch, then
+keep following the stream.
+"""
+import secrets
+import threading
+from collections import deque
+
+# Sent first on every stream, and in place of events when a stream is idle
+STREAM_PREAMBLE = "retry: 3000\n: subscribed\n\n"
+KEEPALIVE = ": keepalive\n\n"
+
+
+class Event:
+    __slots__ = ("id", "name", "data", "_encoded")
+
+    def __init__(self, id, name, data):
+        self.id = id
+        self.name = name
+        self.data = data
+        self._encoded = None
+
+    def encode(self):
+        """Return the event in the text/event-stream wire format."""
+        # Built once, however many subscribers receive it
+        if self._encoded is None:
+            lines = "".join(f"data: {line}\n" for line in self.data.split("\n"))
+            self._encoded = f"id: {self.id}\nevent: {self.name}\n{lines}\n"
+        return self._encoded
+
+
+def encode_events(events):
+    """Return the stream text for a batch from ``Subscription.wait``."""
+    return "".join(event.encode() for event in events) if events else KEEPALIVE
+
+
+class Subscription:
+    """One client's stream: a bounded buffer of events for its user.
+
+    A thread blocks in ``wait``; an event loop sets ``waker`` instead, which is
+    called (from the publishing thread) whenever there is something to read.
+    """
+
+    def __init__(self, hub, user_id, buffer_size):
+        self.hub = hub
+        self.user_id = user_id
+        self.buffer_size = buffer_size
+        self._events = deque()
+        self._reset = None
+        self._cond = threading.Condition()
+        self.closed = False
+        self.waker = None
+
+    def push(self, event):
+        with self._cond:
+            if self._reset is not None or len(self._events) >= self.buffer_size:
+                # Too far behind: drop the backlog and tell the client to refetch
+                self._events.clear()
+                self._reset = event.id
+            else:
+                self._events.append(event)
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+    def reset(self, event_id):
+        with self._cond:
+            self._events.clear()
+            self._reset = event_id
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+    def wait(self, timeout):
+        """Return the buffered events, waiting up to ``timeout`` seconds for one."""
+        with self._cond:
+            if not self._events and self._reset is None:
+                self._cond.wait(timeout)
+            if self._reset is not None:
+                events = [Event(self._reset, "reset", "{}")]
+                self._reset = None
+            else:
+                events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        self.hub.unsubscribe(self)
+        # Wake a waiting stream so it notices
+        with self._cond:
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+
+class EventHub:
+    """Fan events out to per-user subscriptions, keeping the last ``history`` for resuming.
+
+    Event ids are ``<epoch>-<sequence>``; the epoch is new in every process, so
+    an id from before a restart (or from another worker) always leads to a reset.
+    """
+
+    def __init__(self, history=10_000, buffer_size=256):
+        self.buffer_size = buffer_size
+        self.epoch = secrets.token_hex(4)
+        self._sequence = 0
+        self._history = deque(maxlen=history)  # (sequence, user_ids, event)
+        self._subscriptions = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+
+    def publish(self, name, data, user_ids):
+        """Send event ``name`` with the encoded ``data`` to ``user_ids``; return its id."""
+        user_ids = frozenset(user_ids)
+        with self._lock:
+            self._sequence += 1
+            event = Event(f"{self.epoch}-{self._sequence}", name, data)
+            self._history.append((self._sequence, user_ids, event))
+            for user_id in user_ids:
+                for subscription in self._subscriptions.get(user_id, ()):
+                    subscription.push(event)
+        return event.id
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Return a new subscription, primed with the events after ``last_event_id``."""
+        subscription = Subscription(self, user_id, self.buffer_size)
+        with self._lock:
+            if last_event_id:
+                self._replay(subscription, last_event_id)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def _replay(self, subscription, last_event_id):
+        epoch, _, sequence = last_event_id.partition("-")
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) < oldest - 1:
+            subscription.reset(f"{self.epoch}-{self._sequence}")
+            return
+        for event_sequence, user_ids, event in self._history:
+            if event_sequence > int(sequence) and subscription.user_id in user_ids:
+                subscription.push(event)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscription.closed = True
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def close(self):
+        """End every open stream, e.g. before the process shuts down."""
+        with self._lock:
+            subscriptions = [subscription for group in self._subscriptions.values() for subscription in group]
+        for subscription in subscriptions:
+            subscription.close()
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(map(len, self._subscriptions.values()))
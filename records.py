@@ -0,0 +1,156 @@
+"""Compact record types for tables that grow to millions of rows.
+
+A plain task dict costs several hundred bytes before counting its values. The
+slotted ``TaskRecord`` keeps one pointer per field, interns the repeated
+strings (``status``, ``priority``, tags) and packs timestamps into integers. It
+is a read-only mapping, so indexes and handlers read it exactly like a dict; it
+only becomes a real dict when serialized (see ``to_dict``).
+"""
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class _Missing:
+    # Pickles by reference, so an unset slot stays unset after a round trip
+    def __reduce__(self):
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+
+def intern_value(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def encode_timestamp(value):
+    """Pack a naive ISO timestamp into integer microseconds if it round-trips exactly."""
+    if type(value) is str:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if parsed.tzinfo is None and parsed.isoformat() == value:
+            return (parsed - _EPOCH) // _MICROSECOND
+    return value
+
+
+def decode_timestamp(value):
+    if type(value) is int:
+        return (_EPOCH + value * _MICROSECOND).isoformat()
+    return value
+
+
+def encode_tags(value):
+    if type(value) is list:
+        return tuple(intern_value(tag) for tag in value)
+    return value
+
+
+def decode_tags(value):
+    return list(value) if type(value) is tuple else value
+
+
+class TaskRecord(Mapping):
+    """Slotted, read-only task record with the same keys and values as the task dict."""
+
+    FIELDS = ("id", "title", "description", "project_id", "assigned_to", "created_by",
+              "priority", "status", "due_date", "created_at", "completed_at", "tags")
+    # field -> (encode, decode); fields not listed are stored as given
+    CODECS = {
+        "priority": (intern_value, None),
+        "status": (intern_value, None),
+        "due_date": (encode_timestamp, decode_timestamp),
+        "created_at": (encode_timestamp, decode_timestamp),
+        "completed_at": (encode_timestamp, decode_timestamp),
+        "tags": (encode_tags, decode_tags),
+    }
+    # Encoded values live in underscore slots so attribute access (e.g. from a
+    # template) falls back to item access and always sees the decoded value
+    __slots__ = tuple(f"_{field}" for field in FIELDS) + ("_extra",)
+    _SLOTS = {field: f"_{field}" for field in FIELDS}
+    # (field, slot, codec) triples for to_dict
+    _FIELD_SLOTS = tuple(zip(FIELDS, __slots__, map(CODECS.get, FIELDS)))
+
+    def __init__(self, values):
+        extra = None
+        for field, value in values.items():
+            slot = self._SLOTS.get(field)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[field] = value
+                continue
+            codec = self.CODECS.get(field)
+            object.__setattr__(self, slot, codec[0](value) if codec else value)
+        for slot in self._SLOTS.values():
+            if not hasattr(self, slot):
+                object.__setattr__(self, slot, _MISSING)
+        object.__setattr__(self, "_extra", extra)
+
+    @classmethod
+    def from_dict(cls, values):
+        return values if isinstance(values, cls) else cls(values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TaskRecord is read-only; replace it through Table.patch")
+
+    def __getitem__(self, field):
+        slot = self._SLOTS.get(field)
+        if slot is None:
+            if self._extra is not None and field in self._extra:
+                return self._extra[field]
+            raise KeyError(field)
+        value = getattr(self, slot)
+        if value is _MISSING:
+            raise KeyError(field)
+        codec = self.CODECS.get(field)
+        return codec[1](value) if codec and codec[1] else value
+
+    def __iter__(self):
+        for field, slot in self._SLOTS.items():
+            if getattr(self, slot) is not _MISSING:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        # Hot path for serialization: read the slots directly rather than
+        # going through __iter__ and __getitem__ per field
+        result = {}
+        for field, slot, codec in self._FIELD_SLOTS:
+            value = getattr(self, slot)
+            if value is not _MISSING:
+                result[field] = codec[1](value) if codec and codec[1] else value
+        if self._extra is not None:
+            result.update(self._extra)
+        return result
+
+    def __reduce__(self):
+        # Pickle the encoded slots as they are, so snapshots skip the codecs both ways
+        return (_restore, (type(self), tuple(getattr(self, slot) for slot in self.__slots__)))
+
+    def __repr__(self):
+        return f"TaskRecord({self.to_dict()!r})"
+
+
+# The slot descriptors' setters, per record class: calling them directly is
+# about twice as fast as object.__setattr__ when loading a snapshot
+_SLOT_SETTERS = {}
+
+
+def _restore(cls, values):
+    setters = _SLOT_SETTERS.get(cls)
+    if setters is None:
+        setters = _SLOT_SETTERS[cls] = tuple(getattr(cls, slot).__set__ for slot in cls.__slots__)
+    record = object.__new__(cls)
+    for setter, value in zip(setters, values):
+        setter(record, value)
+    return record
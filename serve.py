@@ -0,0 +1,301 @@
+"""Production server: prefork worker processes, each with a pool of threads.
+
+    python serve.py --workers 4 --threads 8 --port 5000
+
+The master binds the socket and forks the workers, which all accept on it.
+With a storage backend shared between processes (sqlite://, shm://) the app is
+imported before forking, so its code and start-up work are done once and shared
+copy-on-write; memory:// and wal:// keep the data inside one process, so they
+run a single worker that imports the app itself.
+
+Signals to the master:
+
+    SIGTERM, SIGINT  stop: workers finish their in-flight requests, then exit
+    SIGHUP           rolling restart: each worker is replaced by a new one,
+                     which starts serving before the old one drains, so the
+                     socket never stops answering. With wal:// the one worker
+                     drains first and its replacement replays the log;
+                     connections wait in the listen backlog meanwhile.
+                     memory:// cannot hand its data over, so SIGHUP is ignored.
+"""
+import argparse
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger("serve")
+
+# Backends whose data every worker process sees
+SHARED_STORAGE = ("sqlite:///", "shm://")
+
+# Seconds an idle keep-alive connection may hold a worker thread
+KEEPALIVE_TIMEOUT = 5
+# Seconds a new worker has to start serving
+STARTUP_TIMEOUT = 60
+BACKLOG = 2048
+
+SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD)
+
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # A draining worker answers what it has accepted, but on fresh connections
+        if self.server.draining:
+            self.close_connection = True
+
+    def log_error(self, format, *args):
+        # An idle keep-alive connection timing out is routine
+        if not format.startswith("Request timed out"):
+            super().log_error(format, *args)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug's WSGI server with a fixed pool of request threads."""
+
+    multithread = True
+
+    def __init__(self, app, fd, threads):
+        super().__init__("", 0, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="request")
+        self.draining = False
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """Stop accepting, then wait for the accepted connections to finish."""
+        self.draining = True
+        self.shutdown()
+        self.pool.shutdown(wait=True)
+
+
+def run_worker(listener, threads, ready):
+    """Serve on the inherited ``listener`` until SIGTERM; never returns."""
+    status = 1
+    try:
+        for signum in SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # The master forwards a stop
+        signal.set_wakeup_fd(-1)
+        master = os.getppid()
+        import app as api
+
+        server = PooledWSGIServer(api.app, listener.fileno(), threads)
+        listener.close()
+
+        def stop(signum, frame):
+            # serve_forever has to be stopped from another thread
+            threading.Thread(target=drain, name="drain").start()
+
+        def drain():
+            api.event_hub.close()
+            server.drain()
+
+        def watch_master():
+            # Killed outright, the master cannot stop us; stop with it
+            while os.getppid() == master:
+                time.sleep(1)
+            logger.warning("Master %d is gone; worker %d stopping", master, os.getpid())
+            drain()
+
+        signal.signal(signal.SIGTERM, stop)
+        threading.Thread(target=watch_master, name="watch-master", daemon=True).start()
+        os.write(ready, b"1")
+        os.close(ready)
+        server.serve_forever()
+        # serve_forever returns as soon as accepting stops; wait for the rest
+        server.pool.shutdown(wait=True)
+        api.storage.commit()
+        api.storage.close()
+        status = 0
+    except BaseException:
+        logger.exception("Worker %d failed", os.getpid())
+    finally:
+        logging.shutdown()
+        os._exit(status)
+
+
+class Master:
+    """Fork and supervise the workers; replace any that die."""
+
+    def __init__(self, listener, workers, threads, graceful_timeout, storage_url):
+        self.listener = listener
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        # Shared storage: preload the app, and start a replacement before the
+        # worker it replaces stops. Otherwise one process owns the data.
+        self.shared = storage_url.startswith(SHARED_STORAGE)
+        self.restartable = storage_url not in ("", "memory://")
+        self.children = set()
+        # Stopped workers still draining
+        self.retiring = set()
+        self.stopping = False
+
+    def spawn(self):
+        """Fork a worker and return its pid once it is serving."""
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            run_worker(self.listener, self.threads, ready_write)
+        os.close(ready_write)
+        self.children.add(pid)
+        try:
+            readable, _, _ = select.select([ready_read], [], [], STARTUP_TIMEOUT)
+            if not readable or not os.read(ready_read, 1):
+                raise RuntimeError(f"Worker {pid} did not start")
+        finally:
+            os.close(ready_read)
+        logger.info("Worker %d serving", pid)
+        return pid
+
+    def retire(self, pid):
+        self.children.discard(pid)
+        self.retiring.add(pid)
+        os.kill(pid, signal.SIGTERM)
+
+    def wait_for(self, pids):
+        """Reap ``pids``, killing whichever outlive the graceful timeout."""
+        deadline = time.monotonic() + self.graceful_timeout
+        pending = set(pids)
+        while pending:
+            for pid in list(pending):
+                try:
+                    exited = os.waitpid(pid, os.WNOHANG)[0]
+                except ChildProcessError:  # Already reaped
+                    exited = True
+                if exited:
+                    pending.discard(pid)
+                    self.retiring.discard(pid)
+            if pending and time.monotonic() > deadline:
+                for pid in pending:
+                    logger.warning("Worker %d did not drain in %ss; killing it", pid, self.graceful_timeout)
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.05)
+
+    def reap(self):
+        """Collect exited workers; return how many of them were still serving."""
+        died = 0
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            self.retiring.discard(pid)
+            if pid in self.children:
+                self.children.discard(pid)
+                logger.warning("Worker %d exited with status %d", pid, os.waitstatus_to_exitcode(status))
+                died += 1
+        return died
+
+    def reload(self):
+        if not self.restartable:
+            logger.warning("memory:// data lives in the worker; ignoring SIGHUP")
+            return
+        logger.info("Rolling restart of %d worker(s)", len(self.children))
+        for pid in list(self.children):
+            if self.shared:
+                self.spawn()
+                self.retire(pid)
+            else:
+                self.retire(pid)
+                self.wait_for([pid])
+                self.spawn()
+
+    def stop(self):
+        self.stopping = True
+        logger.info("Stopping; draining %d worker(s)", len(self.children))
+        for pid in list(self.children):
+            self.retire(pid)
+        self.wait_for(list(self.retiring))
+
+    def run(self):
+        # Signals are queued through a pipe and handled here, between forks
+        wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(wakeup_write, False)
+        signal.set_wakeup_fd(wakeup_write)
+        for signum in SIGNALS:
+            signal.signal(signum, lambda signum, frame: None)
+
+        try:
+            if self.shared:
+                import app  # noqa: F401  Shared copy-on-write by every worker
+            for _ in range(self.workers):
+                self.spawn()
+            while not self.stopping:
+                select.select([wakeup_read], [], [], 1.0)
+                try:
+                    received = os.read(wakeup_read, 64)
+                except BlockingIOError:
+                    received = b""
+                for signum in received:
+                    if signum in (signal.SIGTERM, signal.SIGINT):
+                        self.stop()
+                        break
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                if not self.stopping:
+                    for _ in range(self.reap()):
+                        self.spawn()
+        finally:
+            if not self.stopping:
+                # Failing ourselves: leave no workers behind
+                for pid in self.children | self.retiring:
+                    os.kill(pid, signal.SIGKILL)
+            self.listener.close()
+
+
+def serve(host="127.0.0.1", port=5000, workers=1, threads=8, graceful_timeout=30):
+    storage_url = os.environ.get("STORAGE_URL", "memory://")
+    if workers > 1 and not storage_url.startswith(SHARED_STORAGE):
+        raise SystemExit(f"{storage_url} keeps data inside one process; "
+                         "use sqlite:// or shm:// storage for several workers")
+    if workers > 1 and os.environ.get("AUTH_TOKEN_MODE", "session") != "signed":
+        logger.warning("Session tokens are per worker; set AUTH_TOKEN_MODE=signed")
+
+    listener = socket.create_server((host, port), backlog=BACKLOG)
+    listener.set_inheritable(True)
+    logger.info("Listening on http://%s:%d with %d worker(s) x %d thread(s)",
+                host, listener.getsockname()[1], workers, threads)
+    Master(listener, workers, threads, graceful_timeout, storage_url).run()
+    logger.info("Stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="request threads per worker")
+    parser.add_argument("--graceful-timeout", type=float, default=30,
+                        help="seconds a stopping worker gets to finish its requests")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s %(process)d] %(message)s")
+    serve(args.host, args.port, args.workers, args.threads, args.graceful_timeout)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,588 @@
+"""SQLite storage backend exposing the same interface as ``store.Table``.
+
+Records are stored as JSON next to one column per indexed field, so the index
+declarations used for the in-memory tables double as the SQLite schema. The
+database runs in WAL mode, which lets several worker processes share it: readers
+never block the single writer and vice versa.
+
+Every connection memory-maps the database, so reads come straight from the
+page cache shared by all processes rather than through read() calls. A
+database in shared memory (``shm://name``, under /dev/shm) never touches a
+disk at all: workers share one dataset at memory speed, and writers take
+turns through the WAL lock in its -shm segment.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from itertools import islice
+
+from store import (CountIndex, HashIndex, SortedIndex, TagIndex, TextIndex, UniqueIndex, VersionIndex,
+                   tokenize)
+
+# Ids per IN (...) query when loading an explicit list of records
+FETCH_CHUNK_SIZE = 500
+
+# Bytes of the database each connection maps into its address space
+MMAP_SIZE = 1 << 30
+
+# Where shm:// databases live: a tmpfs, so their pages are shared memory
+SHM_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+class ConnectionPool:
+    """One connection per thread, opened lazily and reopened after a fork."""
+
+    def __init__(self, path, durable=True):
+        self.path = path
+        self.durable = durable
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            # Connections must not cross a fork; start over in the child
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Nothing to sync to when the database lives in memory
+            conn.execute('PRAGMA synchronous=NORMAL' if self.durable else 'PRAGMA synchronous=OFF')
+            conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+class Transactions:
+    """``read()``/``write()`` context managers matching ``store.RWLock``.
+
+    A write opens ``BEGIN IMMEDIATE`` so writers are serialized across threads
+    and processes; a read opens a deferred transaction so multi-statement reads
+    see one snapshot. Nested blocks join the outermost transaction.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._local = threading.local()
+
+    @contextmanager
+    def _transaction(self, begin):
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        conn = self.pool.get()
+        conn.execute(begin)
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.depth = 0
+
+    def read(self):
+        return self._transaction('BEGIN')
+
+    def write(self):
+        return self._transaction('BEGIN IMMEDIATE')
+
+
+class SQLiteBackend:
+    """Storage backend keeping every table in one SQLite database file.
+
+    ``durable=False`` skips fsyncs, for databases kept in shared memory.
+    """
+
+    def __init__(self, path, durable=True):
+        self.pool = ConnectionPool(path, durable)
+        self.transactions = Transactions(self.pool)
+        self.pool.get().execute(
+            'CREATE TABLE IF NOT EXISTS _meta '
+            '(name TEXT PRIMARY KEY, version INTEGER NOT NULL, last_id INTEGER NOT NULL)'
+        )
+
+    def table(self, name, *indexes, record_type=None):
+        # Rows are decoded from JSON on every read, so a compact in-memory
+        # record type would not save anything here
+        return SQLiteTable(self, name, indexes)
+
+    def commit(self):
+        # Every write already commits its own transaction
+        pass
+
+    def close(self):
+        self.pool.close_all()
+
+
+def shared_memory_path(name):
+    """Return the path of the shared-memory database called ``name``."""
+    if not name or os.sep in name:
+        raise ValueError(f"Invalid shared-memory database name: {name!r}")
+    return os.path.join(SHM_DIRECTORY, f'{name}.db')
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SQLiteHashIndex:
+    def __init__(self, table, field):
+        self.table = table
+        self.name = field
+        self.field = field
+
+    def lookup(self, value, after=None):
+        return [row[0] for row in self.table._execute(
+            f'SELECT id FROM {self.table.quoted} WHERE {quote(self.field)} = ? AND id > ? ORDER BY id',
+            (value, -1 if after is None else after),
+        )]
+
+
+class SQLiteCountIndex:
+    def __init__(self, table, index):
+        self.table = table
+        self.name = index.name
+        self.group_field = index.group_field
+        self.field = index.field
+
+    def counts(self, group):
+        """Return a ``{value: count}`` snapshot for ``group``."""
+        return dict(self.table._execute(
+            f'SELECT {quote(self.field)}, COUNT(*) FROM {self.table.quoted} '
+            f'WHERE {quote(self.group_field)} = ? GROUP BY {quote(self.field)}',
+            (group,),
+        ))
+
+
+class SQLiteSortedIndex:
+    def __init__(self, table, index):
+        self.table = table
+        self.name = index.name
+        self.group_field = index.group_field
+        self.index = index
+
+    def sort_key(self, record):
+        return self.index.sort_key(record)
+
+    def range(self, group, after=None, before=None, reverse=False, start=None):
+        """Yield ids in ``group`` whose sort key lies strictly between the bounds."""
+        column = quote(self.name)
+        sql = (f'SELECT id FROM {self.table.quoted} WHERE {quote(self.group_field)} = ? '
+               f'AND {column} IS NOT NULL')
+        params = [group]
+        if after is not None:
+            sql += f' AND {column} > ?'
+            params.append(after)
+        if before is not None:
+            sql += f' AND {column} < ?'
+            params.append(before)
+        if start is not None:
+            sql += f' AND ({column}, id) {"<" if reverse else ">"} (?, ?)'
+            params.extend(start)
+        direction = ' DESC' if reverse else ''
+        for row in self.table._execute(sql + f' ORDER BY {column}{direction}, id{direction}', params):
+            yield row[0]
+
+    def count_before(self, group, before):
+        """Return how many entries in ``group`` sort strictly before ``before``."""
+        return self.table._execute(
+            f'SELECT COUNT(*) FROM {self.table.quoted} WHERE {quote(self.group_field)} = ? '
+            f'AND {quote(self.name)} < ?',
+            (group, before),
+        ).fetchone()[0]
+
+
+class SQLiteTagIndex:
+    """Keeps ``(group, item, id)`` rows for every list item in a side table, via triggers."""
+
+    def __init__(self, table, index):
+        self.table = table
+        self.name = index.name
+        self.group_field = index.group_field
+        self.field = index.field
+        self.quoted = quote(f"{table.name}_{index.name}")
+
+    def _rows(self, source):
+        return (f"SELECT DISTINCT json_extract({source}.data, '$.{self.group_field}'), value, {source}.id "
+                f"FROM json_each({source}.data, '$.{self.field}')")
+
+    def schema(self):
+        table = self.table
+        prefix = f"{table.name}_{self.name}"
+        return [
+            f'CREATE TABLE IF NOT EXISTS {self.quoted} (grp, item, id INTEGER NOT NULL, '
+            f'PRIMARY KEY (grp, item, id)) WITHOUT ROWID',
+            f'CREATE INDEX IF NOT EXISTS {quote(prefix + "_id")} ON {self.quoted} (id)',
+            # Index rows written before this index was declared
+            f'INSERT OR IGNORE INTO {self.quoted} '
+            f"SELECT json_extract(src.data, '$.{self.group_field}'), item.value, src.id "
+            f"FROM {table.quoted} AS src, json_each(src.data, '$.{self.field}') AS item "
+            f'WHERE src.id NOT IN (SELECT id FROM {self.quoted})',
+            # Rows are written with INSERT OR REPLACE, which fires no delete trigger
+            f'CREATE TRIGGER IF NOT EXISTS {quote(prefix + "_insert")} '
+            f'AFTER INSERT ON {table.quoted} BEGIN '
+            f'DELETE FROM {self.quoted} WHERE id = NEW.id; '
+            f'INSERT OR IGNORE INTO {self.quoted} {self._rows("NEW")}; END',
+            f'CREATE TRIGGER IF NOT EXISTS {quote(prefix + "_delete")} '
+            f'AFTER DELETE ON {table.quoted} BEGIN '
+            f'DELETE FROM {self.quoted} WHERE id = OLD.id; END',
+        ]
+
+    def lookup(self, group, item):
+        return [row[0] for row in self.table._execute(
+            f'SELECT id FROM {self.quoted} WHERE grp = ? AND item = ? ORDER BY id', (group, item),
+        )]
+
+    def counts(self, group):
+        return dict(self.table._execute(
+            f'SELECT item, COUNT(*) FROM {self.quoted} WHERE grp = ? GROUP BY item', (group,),
+        ))
+
+
+class SQLiteVersionIndex:
+    """Per-group versions fall back to the table-wide version.
+
+    Tracking groups would mean reading the old row on every write; the table
+    version is coarser (any write invalidates every group) but always correct.
+    """
+
+    def __init__(self, table, index):
+        self.table = table
+        self.name = index.name
+
+    def version(self, group):
+        return self.table.version
+
+
+class SQLiteTextIndex:
+    """Full-text search through an FTS5 table kept in sync by triggers.
+
+    FTS5's bm25 ranking and ``word*`` prefix queries stand in for the
+    in-memory scoring, so scores differ but matches and visibility do not.
+    """
+
+    def __init__(self, table, index):
+        self.table = table
+        self.name = index.name
+        self.fields = index.fields
+        self.quoted = quote(f"{table.name}_{index.name}")
+
+    def _values(self, data):
+        # List values (tags) are indexed as their items joined by spaces
+        return ', '.join(
+            f"CASE json_type({data}, '$.{field}') "
+            f"WHEN 'array' THEN (SELECT group_concat(value, ' ') FROM json_each({data}, '$.{field}')) "
+            f"ELSE json_extract({data}, '$.{field}') END"
+            for field in self.fields
+        )
+
+    def schema(self):
+        table = self.table
+        columns = ', '.join(quote(field) for field in self.fields)
+        values = self._values('NEW.data')
+        return [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.quoted} USING fts5({columns})',
+            # Index rows written before this index was declared
+            f'INSERT INTO {self.quoted} (rowid, {columns}) '
+            f'SELECT id, {self._values("data")} FROM {table.quoted} '
+            f'WHERE id NOT IN (SELECT rowid FROM {self.quoted})',
+            # Rows are written with INSERT OR REPLACE, which fires no delete trigger
+            f'CREATE TRIGGER IF NOT EXISTS {quote(table.name + "_" + self.name + "_insert")} '
+            f'AFTER INSERT ON {table.quoted} BEGIN '
+            f'DELETE FROM {self.quoted} WHERE rowid = NEW.id; '
+            f'INSERT INTO {self.quoted} (rowid, {columns}) VALUES (NEW.id, {values}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {quote(table.name + "_" + self.name + "_delete")} '
+            f'AFTER DELETE ON {table.quoted} BEGIN '
+            f'DELETE FROM {self.quoted} WHERE rowid = OLD.id; END',
+        ]
+
+    def search(self, query, candidates=None, limit=None):
+        """Return ``(pk, score)`` pairs, best first, for records matching every query word."""
+        words = dict.fromkeys(tokenize(query))
+        if not words:
+            return []
+        weights = ', '.join(str(float(weight)) for weight in self.fields.values())
+        rows = self.table._execute(
+            f'SELECT rowid, -bm25({self.quoted}, {weights}) FROM {self.quoted} '
+            f'WHERE {self.quoted} MATCH ? ORDER BY bm25({self.quoted}, {weights}), rowid',
+            (' '.join(f'"{word}"*' for word in words),),
+        )
+        result = []
+        for pk, score in rows:
+            if candidates is None or pk in candidates:
+                result.append((pk, score))
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+class SQLiteTable(MutableMapping):
+    """A table of JSON records with one indexed column per declared index field."""
+
+    def __init__(self, backend, name, indexes):
+        self.name = name
+        self.quoted = quote(name)
+        self.pool = backend.pool
+        self.lock = backend.transactions
+        self.indexes = {}
+        # column name -> function extracting the column value from a record
+        self._columns = {}
+        ddl = []
+        statements = []
+        for index in indexes:
+            if isinstance(index, (HashIndex, UniqueIndex)):
+                self._add_field(index.field)
+                self.indexes[index.name] = SQLiteHashIndex(self, index.field)
+                ddl.append((index.name, (index.field, 'id')))
+            elif isinstance(index, CountIndex):
+                self._add_field(index.group_field)
+                self._add_field(index.field)
+                self.indexes[index.name] = SQLiteCountIndex(self, index)
+                ddl.append((index.name, (index.group_field, index.field)))
+            elif isinstance(index, SortedIndex):
+                self._add_field(index.group_field)
+                self._columns[index.name] = index.sort_key
+                self.indexes[index.name] = SQLiteSortedIndex(self, index)
+                ddl.append((index.name, (index.group_field, index.name)))
+            elif isinstance(index, VersionIndex):
+                self.indexes[index.name] = SQLiteVersionIndex(self, index)
+            elif isinstance(index, TagIndex):
+                self.indexes[index.name] = SQLiteTagIndex(self, index)
+                statements += self.indexes[index.name].schema()
+            elif isinstance(index, TextIndex):
+                self.indexes[index.name] = SQLiteTextIndex(self, index)
+                statements += self.indexes[index.name].schema()
+            else:
+                raise TypeError(f"Unsupported index type: {type(index).__name__}")
+        self._create_schema(ddl, statements)
+
+        column_list = ''.join(f', {quote(column)}' for column in self._columns)
+        placeholders = ''.join(', ?' for _ in self._columns)
+        self._upsert_sql = (f'INSERT OR REPLACE INTO {self.quoted} (id, data{column_list}) '
+                            f'VALUES (?, ?{placeholders})')
+
+    def _add_field(self, field):
+        self._columns.setdefault(field, lambda record, field=field: record.get(field))
+
+    def _create_schema(self, ddl, extra=()):
+        columns = ''.join(f', {quote(column)}' for column in self._columns)
+        statements = [
+            f'CREATE TABLE IF NOT EXISTS {self.quoted} (id INTEGER PRIMARY KEY, data TEXT NOT NULL{columns})',
+        ]
+        for index_name, fields in ddl:
+            statements.append(
+                f'CREATE INDEX IF NOT EXISTS {quote(self.name + "_" + index_name)} '
+                f'ON {self.quoted} ({", ".join(quote(field) for field in fields)})'
+            )
+        # Versions and the id sequence live in _meta so every process sees them
+        meta = f"UPDATE _meta SET version = version + 1 WHERE name = '{self.name}'"
+        statements += [
+            f"INSERT OR IGNORE INTO _meta (name, version, last_id) VALUES ('{self.name}', 0, 0)",
+            f'CREATE TRIGGER IF NOT EXISTS {quote(self.name + "_insert")} AFTER INSERT ON {self.quoted} '
+            f"BEGIN UPDATE _meta SET version = version + 1, last_id = MAX(last_id, NEW.id) "
+            f"WHERE name = '{self.name}'; END",
+            f'CREATE TRIGGER IF NOT EXISTS {quote(self.name + "_update")} AFTER UPDATE ON {self.quoted} '
+            f'BEGIN {meta}; END',
+            f'CREATE TRIGGER IF NOT EXISTS {quote(self.name + "_delete")} AFTER DELETE ON {self.quoted} '
+            f'BEGIN {meta}; END',
+            *extra,
+        ]
+        with self.lock.write():
+            self._execute(statements[0])
+            self._add_missing_columns()
+            for statement in statements[1:]:
+                self._execute(statement)
+
+    def _add_missing_columns(self):
+        # An index declared after the table was created: add its column and
+        # fill it in from the stored records
+        existing = {row[1] for row in self._execute(f'PRAGMA table_info({self.quoted})')}
+        missing = [column for column in self._columns if column not in existing]
+        if not missing:
+            return
+        for column in missing:
+            self._execute(f'ALTER TABLE {self.quoted} ADD COLUMN {quote(column)}')
+        assignments = ', '.join(f'{quote(column)} = ?' for column in missing)
+        rows = self._execute(f'SELECT id, data FROM {self.quoted}').fetchall()
+        self.pool.get().executemany(
+            f'UPDATE {self.quoted} SET {assignments} WHERE id = ?',
+            [(*(self._columns[column](json.loads(data)) for column in missing), pk) for pk, data in rows],
+        )
+
+    def _execute(self, sql, params=()):
+        return self.pool.get().execute(sql, params)
+
+    def _row(self, pk, record):
+        return (pk, json.dumps(record), *(extract(record) for extract in self._columns.values()))
+
+    def _where(self, criteria):
+        for field in criteria:
+            if field not in self._columns:
+                raise KeyError(field)
+        return [f'{quote(field)} = ?' for field in criteria], list(criteria.values())
+
+    # Mapping interface
+
+    def __getitem__(self, pk):
+        row = self._execute(f'SELECT data FROM {self.quoted} WHERE id = ?', (pk,)).fetchone()
+        if row is None:
+            raise KeyError(pk)
+        return json.loads(row[0])
+
+    def __setitem__(self, pk, record):
+        self._execute(self._upsert_sql, self._row(pk, record))
+
+    def __delitem__(self, pk):
+        with self.lock.write():
+            if not self._execute(f'DELETE FROM {self.quoted} WHERE id = ?', (pk,)).rowcount:
+                raise KeyError(pk)
+
+    def __iter__(self):
+        return (row[0] for row in self._execute(f'SELECT id FROM {self.quoted} ORDER BY id').fetchall())
+
+    def __len__(self):
+        return self._execute(f'SELECT COUNT(*) FROM {self.quoted}').fetchone()[0]
+
+    def __contains__(self, pk):
+        return self._execute(f'SELECT 1 FROM {self.quoted} WHERE id = ?', (pk,)).fetchone() is not None
+
+    def get(self, pk, default=None):
+        try:
+            return self[pk]
+        except KeyError:
+            return default
+
+    def values(self):
+        for row in self._execute(f'SELECT data FROM {self.quoted} ORDER BY id'):
+            yield json.loads(row[0])
+
+    def items(self):
+        for pk, data in self._execute(f'SELECT id, data FROM {self.quoted} ORDER BY id'):
+            yield pk, json.loads(data)
+
+    _missing = object()
+
+    def pop(self, pk, default=_missing):
+        with self.lock.write():
+            record = self.get(pk)
+            if record is None:
+                if default is self._missing:
+                    raise KeyError(pk)
+                return default
+            self._execute(f'DELETE FROM {self.quoted} WHERE id = ?', (pk,))
+            return record
+
+    def update(self, *args, **kwargs):
+        rows = [self._row(pk, record) for pk, record in dict(*args, **kwargs).items()]
+        with self.lock.write():
+            self.pool.get().executemany(self._upsert_sql, rows)
+
+    def clear(self):
+        with self.lock.write():
+            self._execute(f'DELETE FROM {self.quoted}')
+            self._execute('UPDATE _meta SET version = version + 1, last_id = 0 WHERE name = ?', (self.name,))
+
+    # Table interface
+
+    @property
+    def version(self):
+        return self._execute('SELECT version FROM _meta WHERE name = ?', (self.name,)).fetchone()[0]
+
+    @property
+    def last_id(self):
+        return self._execute('SELECT last_id FROM _meta WHERE name = ?', (self.name,)).fetchone()[0]
+
+    def next_id(self):
+        """Allocate the next id from the shared sequence; safe across processes."""
+        with self.lock.write():
+            self._execute('UPDATE _meta SET last_id = last_id + 1 WHERE name = ?', (self.name,))
+            return self.last_id
+
+    def patch(self, pk, changes):
+        """Replace record ``pk`` with a copy carrying ``changes`` and return it."""
+        with self.lock.write():
+            record = {**self[pk], **changes}
+            self[pk] = record
+            return record
+
+    def get_by(self, field, value):
+        """Return the first record whose indexed ``field`` equals ``value``, or None."""
+        records = self.page({field: value}, limit=1)
+        return records[0] if records else None
+
+    def filter(self, pks, criteria, limit=None):
+        """Return up to ``limit`` records for ``pks`` matching every ``field=value`` pair."""
+        clauses, params = self._where(criteria)
+        # ``pks`` may be a lazy index scan; only pull as many ids as the limit needs
+        pks = iter(pks)
+        size = FETCH_CHUNK_SIZE if limit is None else min(limit, FETCH_CHUNK_SIZE)
+        result = []
+        with self.lock.read():
+            while True:
+                chunk = list(islice(pks, size))
+                if not chunk:
+                    break
+                sql = (f'SELECT id, data FROM {self.quoted} '
+                       f'WHERE id IN ({", ".join("?" for _ in chunk)})')
+                if clauses:
+                    sql += ' AND ' + ' AND '.join(clauses)
+                found = dict(self._execute(sql, chunk + params))
+                for pk in chunk:
+                    if pk in found:
+                        result.append(json.loads(found[pk]))
+                        if limit is not None and len(result) >= limit:
+                            return result
+        return result
+
+    def page(self, criteria, after=None, limit=None):
+        """Return up to ``limit`` records matching ``criteria`` with ids past ``after``."""
+        clauses, params = self._where(criteria)
+        if after is not None:
+            clauses.append('id > ?')
+            params.append(after)
+        sql = f'SELECT data FROM {self.quoted}'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [json.loads(row[0]) for row in self._execute(sql, params)]
+
+    def find(self, **criteria):
+        """Return the records matching every ``field=value`` pair, in id order."""
+        return self.page(criteria)
+
+    def count(self, **criteria):
+        """Return the number of records matching ``criteria``."""
+        clauses, params = self._where(criteria)
+        sql = f'SELECT COUNT(*) FROM {self.quoted}'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return self._execute(sql, params).fetchone()[0]
@@ -0,0 +1,718 @@
+import heapq
+import math
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sortedcontainers import SortedList
+
+
+class HashIndex:
+    """Secondary index mapping a field value to the sorted ids of the records holding it."""
+
+    def __init__(self, field):
+        self.name = field
+        self.field = field
+        self._buckets = {}
+
+    def add(self, pk, record):
+        value = record.get(self.field)
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            bucket = self._buckets[value] = SortedList()
+        bucket.add(pk)
+
+    def remove(self, pk, record):
+        value = record.get(self.field)
+        bucket = self._buckets.get(value)
+        if bucket is None:
+            return
+        bucket.discard(pk)
+        if not bucket:
+            del self._buckets[value]
+
+    def clear(self):
+        self._buckets.clear()
+
+    def lookup(self, value, after=None):
+        bucket = self._buckets.get(value, ())
+        if after is None or not bucket:
+            return bucket
+        return bucket.irange(after, inclusive=(False, True))
+
+
+class UniqueIndex:
+    """Secondary index mapping a field value to the single record id holding it."""
+
+    def __init__(self, field):
+        self.name = field
+        self.field = field
+        self._ids = {}
+
+    def add(self, pk, record):
+        self._ids[record.get(self.field)] = pk
+
+    def remove(self, pk, record):
+        value = record.get(self.field)
+        if self._ids.get(value) == pk:
+            del self._ids[value]
+
+    def clear(self):
+        self._ids.clear()
+
+    def lookup(self, value, after=None):
+        pk = self._ids.get(value)
+        if pk is None or (after is not None and pk <= after):
+            return ()
+        return (pk,)
+
+
+class CountIndex:
+    """Per-group counters of a field's values, e.g. task statuses per assignee."""
+
+    def __init__(self, group_field, field):
+        self.name = f"{field}_by_{group_field}"
+        self.group_field = group_field
+        self.field = field
+        self._counts = {}
+
+    def add(self, pk, record):
+        counts = self._counts.setdefault(record.get(self.group_field), {})
+        value = record.get(self.field)
+        counts[value] = counts.get(value, 0) + 1
+
+    def remove(self, pk, record):
+        group = record.get(self.group_field)
+        counts = self._counts.get(group)
+        if counts is None:
+            return
+        value = record.get(self.field)
+        counts[value] -= 1
+        if not counts[value]:
+            del counts[value]
+        if not counts:
+            del self._counts[group]
+
+    def clear(self):
+        self._counts.clear()
+
+    def counts(self, group):
+        """Return a ``{value: count}`` snapshot for ``group``."""
+        return dict(self._counts.get(group, ()))
+
+
+class TagIndex:
+    """Per-group index from each item of a list field to the sorted ids carrying it.
+
+    For example, ``TagIndex("assigned_to", "tags")`` maps an assignee and a tag to
+    the ids of that assignee's tasks with the tag. Bucket sizes double as counts.
+    """
+
+    def __init__(self, group_field, field):
+        self.name = f"{field}_by_{group_field}"
+        self.group_field = group_field
+        self.field = field
+        self._groups = {}
+
+    def _items(self, record):
+        return set(record.get(self.field) or ())
+
+    def add(self, pk, record):
+        buckets = self._groups.setdefault(record.get(self.group_field), {})
+        for item in self._items(record):
+            bucket = buckets.get(item)
+            if bucket is None:
+                bucket = buckets[item] = SortedList()
+            bucket.add(pk)
+
+    def remove(self, pk, record):
+        group = record.get(self.group_field)
+        buckets = self._groups.get(group)
+        if buckets is None:
+            return
+        for item in self._items(record):
+            bucket = buckets.get(item)
+            if bucket is None:
+                continue
+            bucket.discard(pk)
+            if not bucket:
+                del buckets[item]
+        if not buckets:
+            del self._groups[group]
+
+    def clear(self):
+        self._groups.clear()
+
+    def lookup(self, group, item):
+        """Return the sorted ids in ``group`` whose list holds ``item``."""
+        return self._groups.get(group, {}).get(item, ())
+
+    def counts(self, group):
+        """Return a ``{item: count}`` snapshot for ``group``."""
+        return {item: len(bucket) for item, bucket in self._groups.get(group, {}).items()}
+
+
+class VersionIndex:
+    """Per-group change counters, e.g. one version per assignee for their task list.
+
+    Any write that adds or removes a record in a group gives that group a new
+    version drawn from one increasing clock, so a version is never reused, not
+    even across ``clear``.
+    """
+
+    def __init__(self, group_field):
+        self.name = f"version_by_{group_field}"
+        self.group_field = group_field
+        self._versions = {}
+        self._clock = 0
+        self._cleared_at = 0
+
+    def _bump(self, record):
+        self._clock += 1
+        self._versions[record.get(self.group_field)] = self._clock
+
+    def add(self, pk, record):
+        self._bump(record)
+
+    def remove(self, pk, record):
+        self._bump(record)
+
+    def clear(self):
+        self._versions.clear()
+        self._clock += 1
+        self._cleared_at = self._clock
+
+    def version(self, group):
+        return self._versions.get(group, self._cleared_at)
+
+
+def tokenize(text):
+    """Split text into lowercase words (letters and digits only)."""
+    return re.findall(r"[^\W_]+", text.lower())
+
+
+class TextIndex:
+    """Inverted index over text fields, for ranked full-text search.
+
+    ``fields`` maps each field to its weight. A list value, such as tags, counts
+    as one text per item. Each term keeps a posting map ``{pk: weight}``, and a
+    sorted term list lets query words match as prefixes.
+    """
+
+    # Score multiplier for a word that only matches as a prefix of a term
+    PREFIX_WEIGHT = 0.5
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self._postings = {}
+        self._terms = SortedList()
+        self._documents = 0
+
+    def _term_weights(self, record):
+        weights = {}
+        for field, weight in self.fields.items():
+            value = record.get(field)
+            if not value:
+                continue
+            for text in (value if isinstance(value, (list, tuple)) else (value,)):
+                for term in tokenize(str(text)):
+                    weights[term] = weights.get(term, 0) + weight
+        return weights
+
+    def add(self, pk, record):
+        self._documents += 1
+        for term, weight in self._term_weights(record).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._terms.add(term)
+            postings[pk] = weight
+
+    def remove(self, pk, record):
+        self._documents -= 1
+        for term in self._term_weights(record):
+            postings = self._postings[term]
+            del postings[pk]
+            if not postings:
+                del self._postings[term]
+                self._terms.remove(term)
+
+    def clear(self):
+        self._postings.clear()
+        self._terms.clear()
+        self._documents = 0
+
+    def search(self, query, candidates=None, limit=None):
+        """Return ``(pk, score)`` pairs, best first, for records matching every query word.
+
+        Each word matches terms equal to it or starting with it; scores add
+        up the field weights times the term's inverse document frequency.
+        ``candidates`` (a set of ids) restricts the search to those records.
+        """
+        scores = None
+        for word in dict.fromkeys(tokenize(query)):
+            word_scores = {}
+            for term in self._terms.irange(word, word + "\U0010ffff"):
+                postings = self._postings[term]
+                boost = math.log(1 + self._documents / len(postings))
+                if term != word:
+                    boost *= self.PREFIX_WEIGHT
+                if candidates is not None and len(candidates) < len(postings):
+                    matches = ((pk, postings[pk]) for pk in candidates if pk in postings)
+                else:
+                    matches = postings.items()
+                for pk, weight in matches:
+                    if candidates is None or pk in candidates:
+                        word_scores[pk] = max(word_scores.get(pk, 0), weight * boost)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {pk: score + scores[pk] for pk, score in word_scores.items() if pk in scores}
+            if not scores:
+                break
+        if not scores:
+            return []
+        order = lambda item: (-item[1], item[0])
+        if limit is None:
+            return sorted(scores.items(), key=order)
+        return heapq.nsmallest(limit, scores.items(), key=order)
+
+
+class SortedIndex:
+    """Per-group records ordered by a derived sort key, for range queries.
+
+    ``key`` turns the field value into something orderable (and is computed once
+    per write); records where it yields None, or that fail ``where``, are left out.
+    Records without the field are left out too, unless ``missing`` gives them a
+    sort key of their own (e.g. ``float('inf')`` to sort them last).
+    """
+
+    def __init__(self, name, group_field, field, key=None, where=None, missing=None):
+        self.name = name
+        self.group_field = group_field
+        self.field = field
+        self.key = key or (lambda value: value)
+        self.where = where
+        self.missing = missing
+        self._groups = {}
+
+    def sort_key(self, record):
+        """Return the record's sort key, or None when it is left out of the index."""
+        if self.where is not None and not self.where(record):
+            return None
+        value = record.get(self.field)
+        if value is None:
+            return self.missing
+        key = self.key(value)
+        return self.missing if key is None else key
+
+    def _entry(self, pk, record):
+        value = self.sort_key(record)
+        if value is None:
+            return None
+        return (value, pk)
+
+    def add(self, pk, record):
+        entry = self._entry(pk, record)
+        if entry is None:
+            return
+        group = record.get(self.group_field)
+        entries = self._groups.get(group)
+        if entries is None:
+            entries = self._groups[group] = SortedList()
+        entries.add(entry)
+
+    def remove(self, pk, record):
+        entry = self._entry(pk, record)
+        if entry is None:
+            return
+        group = record.get(self.group_field)
+        entries = self._groups.get(group)
+        if entries is None:
+            return
+        entries.discard(entry)
+        if not entries:
+            del self._groups[group]
+
+    def clear(self):
+        self._groups.clear()
+
+    def range(self, group, after=None, before=None, reverse=False, start=None):
+        """Yield ids in ``group`` whose sort key lies strictly between the bounds.
+
+        Ids come in ``(key, id)`` order, descending when ``reverse``. ``start``, a
+        ``(key, id)`` pair, resumes just past that entry in the same direction.
+        """
+        entries = self._groups.get(group)
+        if entries is None:
+            return
+        minimum = None if after is None else (after, float('inf'))
+        maximum = None if before is None else (before, float('-inf'))
+        if start is not None:
+            if reverse:
+                maximum = start if maximum is None else min(maximum, start)
+            else:
+                minimum = start if minimum is None else max(minimum, start)
+        for _, pk in entries.irange(minimum, maximum, inclusive=(False, False), reverse=reverse):
+            yield pk
+
+    def count_before(self, group, before):
+        """Return how many entries in ``group`` sort strictly before ``before``."""
+        entries = self._groups.get(group)
+        if entries is None:
+            return 0
+        return entries.bisect_left((before, float('-inf')))
+
+
+class RWLock:
+    """Many concurrent readers or one writer; writers are preferred.
+
+    Both sides are re-entrant per thread, and a thread holding the write lock may
+    also read. Upgrading a read lock to a write lock is not supported.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        depth = getattr(self._local, 'depth', 0)
+        if depth or self._writer == me:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+class Table(dict):
+    """A dict of records keyed by id that keeps its secondary indexes in sync.
+
+    Every write path of ``dict`` goes through ``_index``/``_unindex`` so that code
+    treating the table as a plain dict (including the test fixtures) never leaves
+    the indexes stale. Records must not be mutated in place; use ``patch`` instead.
+
+    Writes hold ``lock`` exclusively and the query methods hold it shared, so the
+    table can be used from a multi-threaded server. Since stored records are never
+    mutated, a record fetched with ``get`` can be serialized without the lock.
+    Code that reads an index directly, or that must check and then write, wraps
+    the whole sequence in ``lock.read()`` or ``lock.write()``.
+    """
+
+    def __init__(self, *indexes, record_type=None):
+        super().__init__()
+        self.indexes = {index.name: index for index in indexes}
+        # Optional compact representation (e.g. records.TaskRecord) that stored
+        # dicts are converted to; it must offer from_dict() and read like a dict
+        self.record_type = record_type
+        self.lock = RWLock()
+        # Bumped on every write so readers can cache derived views cheaply
+        self.version = 0
+        # Highest id ever stored; ids are never handed out twice, even after a delete
+        self.last_id = 0
+        self._id_lock = threading.Lock()
+
+    def _index(self, pk, record):
+        self.version += 1
+        added = []
+        try:
+            for index in self.indexes.values():
+                index.add(pk, record)
+                added.append(index)
+        except Exception:
+            # A value an index cannot hold (e.g. unhashable): leave no trace of it
+            for index in reversed(added):
+                index.remove(pk, record)
+            raise
+
+    def _unindex(self, pk, record):
+        self.version += 1
+        for index in self.indexes.values():
+            index.remove(pk, record)
+
+    def __setitem__(self, pk, record):
+        if self.record_type is not None:
+            record = self.record_type.from_dict(record)
+        with self.lock.write():
+            old = dict.get(self, pk)
+            if old is not None:
+                self._unindex(pk, old)
+            try:
+                self._index(pk, record)
+            except Exception:
+                if old is not None:
+                    self._index(pk, old)
+                raise
+            dict.__setitem__(self, pk, record)
+            if isinstance(pk, int) and pk > self.last_id:
+                with self._id_lock:
+                    self.last_id = max(self.last_id, pk)
+
+    def __delitem__(self, pk):
+        with self.lock.write():
+            record = dict.__getitem__(self, pk)
+            dict.__delitem__(self, pk)
+            self._unindex(pk, record)
+
+    _missing = object()
+
+    def pop(self, pk, default=_missing):
+        with self.lock.write():
+            if pk not in self:
+                if default is self._missing:
+                    raise KeyError(pk)
+                return default
+            record = dict.pop(self, pk)
+            self._unindex(pk, record)
+            return record
+
+    def popitem(self):
+        with self.lock.write():
+            pk, record = dict.popitem(self)
+            self._unindex(pk, record)
+            return pk, record
+
+    def setdefault(self, pk, default=None):
+        with self.lock.write():
+            if pk not in self:
+                self[pk] = default
+            return self[pk]
+
+    def update(self, *args, **kwargs):
+        with self.lock.write():
+            for pk, record in dict(*args, **kwargs).items():
+                self[pk] = record
+
+    def clear(self):
+        with self.lock.write():
+            dict.clear(self)
+            self.version += 1
+            with self._id_lock:
+                self.last_id = 0
+            for index in self.indexes.values():
+                index.clear()
+
+    def next_id(self):
+        """Allocate the next id in O(1); safe to call from concurrent requests."""
+        with self._id_lock:
+            self.last_id += 1
+            return self.last_id
+
+    def patch(self, pk, changes):
+        """Replace record ``pk`` with a copy carrying ``changes`` and return it."""
+        with self.lock.write():
+            self[pk] = {**self[pk], **changes}
+            return dict.__getitem__(self, pk)
+
+    def get_by(self, field, value):
+        """Return the first record whose indexed ``field`` equals ``value``, or None."""
+        with self.lock.read():
+            for pk in self.indexes[field].lookup(value):
+                return dict.__getitem__(self, pk)
+            return None
+
+    def filter(self, pks, criteria, limit=None):
+        """Return up to ``limit`` records for ``pks`` matching every ``field=value`` pair."""
+        result = []
+        with self.lock.read():
+            for pk in pks:
+                record = dict.get(self, pk)
+                if record is None:
+                    continue
+                if all(record.get(field) == value for field, value in criteria.items()):
+                    result.append(record)
+                    if limit is not None and len(result) >= limit:
+                        break
+        return result
+
+    def page(self, criteria, after=None, limit=None):
+        """Return up to ``limit`` records matching ``criteria`` with ids past ``after``.
+
+        Each field must be indexed. The smallest matching bucket is walked from
+        just past ``after`` and the remaining criteria are checked per record, so
+        the cost is bounded by the most selective filter and by the page size,
+        not by the size of the table.
+        """
+        with self.lock.read():
+            if not criteria:
+                pks = (pk for pk in sorted(self) if after is None or pk > after)
+            else:
+                field = min(criteria, key=lambda field: len(self.indexes[field].lookup(criteria[field])))
+                pks = self.indexes[field].lookup(criteria[field], after)
+            return self.filter(pks, criteria, limit)
+
+    def find(self, **criteria):
+        """Return the records matching every ``field=value`` pair, in id order."""
+        return self.page(criteria)
+
+    def count(self, **criteria):
+        """Return the number of records matching ``criteria``."""
+        with self.lock.read():
+            if len(criteria) == 1:
+                (field, value), = criteria.items()
+                return len(self.indexes[field].lookup(value))
+            return len(self.find(**criteria))
+
+
+class SessionStore:
+    """Login sessions with idle and absolute expiry, a size bound and per-user revocation.
+
+    Sessions are kept in least-recently-used order, so expiring idle sessions and
+    evicting over the size limit only ever look at the front of the queue; that
+    work is amortized over logins and lookups instead of needing a sweeper thread.
+    """
+
+    def __init__(self, idle_ttl=3600, absolute_ttl=86400, max_size=100_000, clock=time.time):
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
+        self.max_size = max_size
+        self.clock = clock
+        # token -> [user_id, created_at, last_seen], least recently used first
+        self._sessions = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, token):
+        user_id = self._sessions.pop(token)[0]
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user_id]
+
+    def _expire(self, now):
+        # Only the least recently used sessions can have gone idle
+        while self._sessions:
+            token, (_, created_at, last_seen) = next(iter(self._sessions.items()))
+            if last_seen + self.idle_ttl > now and created_at + self.absolute_ttl > now:
+                break
+            self._drop(token)
+
+    def create(self, user_id):
+        """Start a session for ``user_id`` and return its token."""
+        token = str(uuid.uuid4())
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            while len(self._sessions) >= self.max_size:
+                self._drop(next(iter(self._sessions)))
+            self._sessions[token] = [user_id, now, now]
+            self._by_user.setdefault(user_id, set()).add(token)
+        return token
+
+    def get(self, token):
+        """Return the user id for a live ``token`` (refreshing its idle timer), or None."""
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if session[1] + self.absolute_ttl <= now:
+                self._drop(token)
+                return None
+            session[2] = now
+            self._sessions.move_to_end(token)
+            return session[0]
+
+    def revoke(self, token):
+        with self._lock:
+            if token in self._sessions:
+                self._drop(token)
+
+    def revoke_user(self, user_id):
+        """End every session of ``user_id``; returns how many were revoked."""
+        with self._lock:
+            tokens = self._by_user.pop(user_id, set())
+            for token in tokens:
+                del self._sessions[token]
+            return len(tokens)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._by_user.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, token):
+        return self.get(token) is not None
+
+
+class MemoryBackend:
+    """Process-local storage: every table is an indexed in-memory ``Table``."""
+
+    def table(self, name, *indexes, record_type=None):
+        return Table(*indexes, record_type=record_type)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_backend(url):
+    """Return the storage backend for ``url``.
+
+    ``memory://``, ``wal:///path/to/dir`` (in memory, made durable by a
+    write-ahead log), ``sqlite:///path/to.db`` or ``shm://name`` (SQLite in
+    shared memory, one dataset for every worker process on the machine).
+    As with SQLAlchemy's ``sqlite:///``, the path follows the third slash:
+    ``wal:///data`` is ``./data`` and ``wal:////var/lib/tasks`` is absolute.
+    """
+    if url in ('', 'memory://'):
+        return MemoryBackend()
+    if url.startswith('wal:///'):
+        from wal_store import WALBackend
+        return WALBackend(url[len('wal:///'):])
+    if url.startswith('sqlite:///'):
+        from sqlite_store import SQLiteBackend
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith('shm://'):
+        from sqlite_store import SQLiteBackend, shared_memory_path
+        return SQLiteBackend(shared_memory_path(url[len('shm://'):]), durable=False)
+    raise ValueError(f"Unsupported storage URL: {url}")
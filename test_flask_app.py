@@ -1,9 +1,24 @@
 import pytest
+import asyncio
 import subprocess
 import time
 import os
 import signal
+import sys
 import logging
+import gzip
+import json
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+import app as app_module
+import asgi
+from app import app, sessions, token_signer
+from events import EventHub
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -55,6 +70,18 @@ class TestAuthenticationEndpoints:
         data = response.get_json()
         assert data['error'] == 'Invalid credentials'
 
+    @pytest.mark.auth
+    def test_non_string_email_is_refused(self, client, sample_user_data):
+        """Test that an email of the wrong type is refused at login, signup and update."""
+        response = client.post('/auth/login', json={'email': {'a': 1}, 'password': 'password123'})
+        assert response.status_code == 401
+
+        response = client.post('/users', json={**sample_user_data, 'email': ['a@example.com']})
+        assert response.status_code == 400
+        response = client.put('/users/1', json={'email': {'a': 1}})
+        assert response.status_code == 400
+        assert client.get('/users/1').get_json()['email'] == 'pradnya@example.com'
+
     @pytest.mark.auth
     def test_logout_success(self, client, auth_headers):
         """Test successful logout."""
@@ -106,6 +133,24 @@ class TestUserEndpoints:
         assert data['name'] == 'Updated Pradnya'
         assert data['email'] == 'updated.pradnya@example.com'
 
+    @pytest.mark.crud
+    def test_update_user_email_changes_login(self, client):
+        """Test that login follows an email change made through PUT."""
+        client.put('/users/1', json={'email': 'new.pradnya@example.com'})
+
+        response = client.post('/auth/login', json={
+            'email': 'pradnya@example.com',
+            'password': 'password123'
+        })
+        assert response.status_code == 401
+
+        response = client.post('/auth/login', json={
+            'email': 'new.pradnya@example.com',
+            'password': 'password123'
+        })
+        assert response.status_code == 200
+        assert response.get_json()['user']['id'] == 1
+
     @pytest.mark.crud
     def test_delete_user_success(self, client):
         """Test deleting user (DELETE)."""
@@ -121,6 +166,17 @@ class TestUserEndpoints:
         assert response.status_code == 404
 
 
+    @pytest.mark.crud
+    def test_get_user_fields(self, client):
+        """Test that ?fields= limits the user to the requested keys."""
+        response = client.get('/users/1?fields=id,name')
+        assert response.get_json() == {'id': 1, 'name': 'Pradnya'}
+
+        response = client.get('/users/1?fields=name,password')
+        assert response.status_code == 400
+        assert 'password' in response.get_json()['error']
+
+
 class TestProjectEndpoints:
     """Test project-related CRUD operations."""
 
@@ -147,6 +203,16 @@ class TestProjectEndpoints:
         assert len(data) == 2  # Initial data has 2 projects for user 1
         assert all('task_count' in project for project in data)
 
+    @pytest.mark.crud
+    def test_get_projects_pagination(self, client, auth_headers):
+        """Test paging through projects with limit and after."""
+        response = client.get('/projects?limit=1', headers=auth_headers)
+        assert [project['id'] for project in response.get_json()] == [1]
+        assert response.get_json()[0]['task_count'] == 1
+
+        response = client.get('/projects?limit=1&after=1', headers=auth_headers)
+        assert [project['id'] for project in response.get_json()] == [2]
+
     @pytest.mark.crud
     def test_update_project_success(self, client, auth_headers):
         """Test updating project (PUT)."""
@@ -165,6 +231,37 @@ class TestProjectEndpoints:
         assert data['status'] == 'inactive'
 
 
+    @pytest.mark.crud
+    def test_get_projects_fields(self, client, auth_headers):
+        """Test projecting projects, with and without the computed task count."""
+        response = client.get('/projects?fields=id,task_count', headers=auth_headers)
+        assert response.get_json() == [{'id': 1, 'task_count': 1}, {'id': 2, 'task_count': 1}]
+
+        response = client.get('/projects?fields=name', headers=auth_headers)
+        assert [list(project) for project in response.get_json()] == [['name'], ['name']]
+
+
+    @pytest.mark.crud
+    def test_project_task_counts_follow_writes(self, client, auth_headers, sample_task_data):
+        """Test per-project counts across task creation, moves, status changes and deletion."""
+        from app import projects
+
+        def counts():
+            response = client.get('/projects?fields=id,task_count,task_status_counts', headers=auth_headers)
+            return {project['id']: (project['task_count'], project['task_status_counts'])
+                    for project in response.get_json()}
+
+        assert counts() == {1: (1, {'in_progress': 1}), 2: (1, {'todo': 1})}
+
+        task_id = client.post('/tasks', json=sample_task_data, headers=auth_headers).get_json()['id']
+        client.put('/tasks/1', json={'project_id': 2, 'status': 'completed'}, headers=auth_headers)
+        assert counts() == {1: (1, {'todo': 1}), 2: (2, {'todo': 1, 'completed': 1})}
+
+        client.delete(f'/tasks/{task_id}', headers=auth_headers)
+        assert counts() == {1: (0, {}), 2: (2, {'todo': 1, 'completed': 1})}
+        assert 'task_count' not in projects[1]
+
+
 class TestTaskEndpoints:
     """Test task-related CRUD operations."""
 
@@ -204,6 +301,107 @@ class TestTaskEndpoints:
         data = response.get_json()
         assert all(task['priority'] == 'high' for task in data)
 
+    @pytest.mark.crud
+    def test_get_tasks_filters_follow_updates(self, client, auth_headers, sample_task_data):
+        """Test that task filters reflect created, updated and deleted tasks."""
+        response = client.post('/tasks', json=sample_task_data, headers=auth_headers)
+        new_id = response.get_json()['id']
+
+        response = client.get('/tasks?project_id=1&status=todo', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [new_id]
+
+        client.put('/tasks/1', json={'status': 'todo'}, headers=auth_headers)
+        response = client.get('/tasks?status=todo', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [1, new_id]
+        response = client.get('/tasks?status=in_progress', headers=auth_headers)
+        assert response.get_json() == []
+
+        # Reassigning a task moves it out of the caller's results
+        client.put(f'/tasks/{new_id}', json={'assigned_to': 2}, headers=auth_headers)
+        response = client.get('/tasks', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [1]
+
+        client.delete('/tasks/1', headers=auth_headers)
+        response = client.get('/tasks?priority=high', headers=auth_headers)
+        assert response.get_json() == []
+
+    @pytest.mark.crud
+    def test_get_tasks_due_date_range(self, client, auth_headers, sample_task_data):
+        """Test filtering tasks by due date range."""
+        sample_task_data['due_date'] = (datetime.now() + timedelta(days=30)).isoformat()
+        response = client.post('/tasks', json=sample_task_data, headers=auth_headers)
+        new_id = response.get_json()['id']
+
+        next_week = (datetime.now() + timedelta(days=8)).isoformat()
+        response = client.get(f'/tasks?due_before={next_week}', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [1]
+
+        response = client.get(f'/tasks?due_after={next_week}', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [new_id]
+
+        response = client.get('/tasks?due_before=not-a-date', headers=auth_headers)
+        assert response.status_code == 400
+
+    @pytest.mark.api
+    def test_create_task_invalid_due_date(self, client, auth_headers):
+        """Test creating a task with an unparseable due date."""
+        response = client.post('/tasks', json={'title': 'Bad date', 'due_date': 'tomorrow'},
+                               headers=auth_headers)
+
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid due date'
+
+    @pytest.mark.api
+    def test_update_task_invalid_dates(self, client, auth_headers):
+        """Test that unparseable creation and completion dates are rejected on update."""
+        for fields in [{'completed_at': 'garbage'}, {'created_at': 5}]:
+            response = client.put('/tasks/1', json=fields, headers=auth_headers)
+            assert response.status_code == 400
+
+        response = client.put('/tasks/1', json={'title': 'Still updatable'}, headers=auth_headers)
+        assert response.status_code == 200
+
+    @pytest.mark.crud
+    def test_get_tasks_keyset_pagination(self, client, auth_headers, sample_task_data):
+        """Test paging through tasks with limit and after."""
+        for _ in range(4):
+            client.post('/tasks', json=sample_task_data, headers=auth_headers)
+
+        response = client.get('/tasks?status=todo&limit=3', headers=auth_headers)
+        first_page = [task['id'] for task in response.get_json()]
+        assert first_page == [3, 4, 5]
+        assert 'after=5' in response.headers['Link']
+
+        response = client.get(f'/tasks?status=todo&limit=3&after={first_page[-1]}',
+                              headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [6]
+        assert 'Link' not in response.headers
+
+        response = client.get('/tasks?limit=0', headers=auth_headers)
+        assert response.status_code == 400
+
+    @pytest.mark.crud
+    def test_get_tasks_streaming(self, client, auth_headers, sample_task_data):
+        """Test streaming tasks as NDJSON and as a chunked JSON array."""
+        for _ in range(3):
+            client.post('/tasks', json=sample_task_data, headers=auth_headers)
+
+        response = client.get('/tasks?stream=ndjson&after=1', headers=auth_headers)
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(line)['id'] for line in lines] == [3, 4, 5]
+
+        response = client.get('/tasks?stream=json&limit=2', headers=auth_headers)
+        assert [task['id'] for task in json.loads(response.get_data(as_text=True))] == [1, 3]
+
+    @pytest.mark.crud
+    def test_task_ids_not_reused_after_delete(self, client, auth_headers, sample_task_data):
+        """Test that deleting the newest task does not free its ID."""
+        client.delete('/tasks/2', headers=auth_headers)
+
+        response = client.post('/tasks', json=sample_task_data, headers=auth_headers)
+        assert response.get_json()['id'] == 3
+
     @pytest.mark.crud
     def test_update_task_success(self, client, auth_headers):
         """Test updating task (PUT)."""
@@ -239,6 +437,620 @@ class TestTaskEndpoints:
         assert len(data) == 0
 
 
+    @pytest.mark.crud
+    def test_get_tasks_fields(self, client, auth_headers):
+        """Test that ?fields= returns only the requested task keys, also when paging or streaming."""
+        response = client.get('/tasks?fields=id,title,status,due_date', headers=auth_headers)
+        tasks = response.get_json()
+        assert response.status_code == 200
+        assert set(tasks[0]) == {'id', 'title', 'status', 'due_date'}
+
+        response = client.get('/tasks?fields=title&limit=1&stream=ndjson', headers=auth_headers)
+        assert json.loads(response.data) == {'title': tasks[0]['title']}
+
+        response = client.get('/tasks?fields=title,secret', headers=auth_headers)
+        assert response.status_code == 400
+
+
+    @pytest.mark.api
+    def test_get_tasks_sorted(self, client, auth_headers, sample_task_data):
+        """Test sort orders, missing values, range filters and cursor paging on sorted lists."""
+        soon = (datetime.now() + timedelta(days=1)).isoformat()
+        for priority, due_date in [('low', soon), ('high', None), ('medium', soon)]:
+            client.post('/tasks', json={**sample_task_data, 'priority': priority, 'due_date': due_date},
+                        headers=auth_headers)
+
+        def ids(query):
+            return [task['id'] for task in client.get(f'/tasks?{query}', headers=auth_headers).get_json()]
+
+        # Task 1 is due in 7 days; tasks without a due date come last
+        assert ids('sort=due_date') == [3, 5, 1, 4]
+        assert ids('sort=due_date&order=desc') == [4, 1, 5, 3]
+        assert ids('sort=priority&order=desc') == [4, 1, 5, 3]  # Ties reverse too
+        assert ids(f'sort=created_at&due_before={soon}') == []
+        assert ids(f'sort=priority&due_after={datetime.now().isoformat()}') == [3, 5, 1]
+
+        client.put('/tasks/5', json={'status': 'completed'}, headers=auth_headers)
+        assert ids('sort=due_date&completed_after=2000-01-01') == [5]
+
+        response = client.get('/tasks?sort=due_date&order=desc&limit=2', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [4, 1]
+        next_url = response.headers['Link'].split(';')[0].strip('<>')
+        assert [task['id'] for task in client.get(next_url, headers=auth_headers).get_json()] == [5, 3]
+
+        assert client.get('/tasks?sort=title', headers=auth_headers).status_code == 400
+
+    @pytest.mark.api
+    def test_filter_tasks_by_tag(self, client, auth_headers, sample_task_data):
+        """Test any-of and all-of tag filters and the caller's tag counts."""
+        client.post('/tasks', json={**sample_task_data, 'tags': ['learning', 'work']}, headers=auth_headers)
+        client.post('/tasks', json={**sample_task_data, 'tags': ['work']}, headers=auth_headers)
+
+        def ids(query):
+            return [task['id'] for task in client.get(f'/tasks?{query}', headers=auth_headers).get_json()]
+
+        assert ids('tag=learning&tag=work') == [1, 3, 4]
+        assert ids('tag=learning,work&tag_match=all') == [3]
+        assert ids('tag=work&limit=1&after=3') == [4]
+        assert client.get('/tags', headers=auth_headers).get_json() == {
+            'learning': 2, 'programming': 1, 'work': 2}
+
+        # Updates replace the tag list
+        client.put('/tasks/1', json={'tags': ['work']}, headers=auth_headers)
+        client.delete('/tasks/4', headers=auth_headers)
+        assert ids('tag=work') == [1, 3]
+        assert client.get('/tags', headers=auth_headers).get_json() == {'learning': 1, 'work': 2}
+
+        assert client.get('/tasks?tag=work&tag_match=some', headers=auth_headers).status_code == 400
+
+    @pytest.mark.api
+    def test_tags_must_be_a_list_of_strings(self, client, auth_headers):
+        """Test that a tag string or non-string tags are refused on create, update and batch."""
+        for tags in ['urgent', 5, ['urgent', 1], None]:
+            response = client.post('/tasks', json={'title': 't', 'tags': tags}, headers=auth_headers)
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Tags must be a list of strings'
+            assert client.put('/tasks/1', json={'tags': tags}, headers=auth_headers).status_code == 400
+        response = client.post('/tasks/batch', json={'operations': [
+            {'op': 'create', 'data': {'title': 't', 'tags': 'urgent'}}]}, headers=auth_headers)
+        assert response.get_json()['results'][0]['status'] == 400
+
+        assert client.get('/tags', headers=auth_headers).get_json() == {'learning': 1, 'programming': 1}
+
+    @pytest.mark.api
+    def test_search_tasks_ranked_and_visible(self, client, auth_headers, logged_in_user_2):
+        """Test that search ranks matches and only returns tasks the caller may see."""
+        client.post('/tasks', json={'title': 'Review docs', 'description': 'Flask API notes'},
+                    headers=auth_headers)
+
+        response = client.get('/tasks/search?q=fla', headers=auth_headers)
+        assert response.status_code == 200
+        assert [task['id'] for task in response.get_json()] == [1, 3]
+
+        # User 2 sees task 2 (assigned to them) but not task 1
+        response = client.get('/tasks/search?q=documentation&fields=id', headers=logged_in_user_2)
+        assert response.get_json() == [{'id': 2}]
+        response = client.get('/tasks/search?q=flask', headers=logged_in_user_2)
+        assert response.get_json() == []
+
+        client.delete('/tasks/3', headers=auth_headers)
+        response = client.get('/tasks/search?q=review', headers=auth_headers)
+        assert response.get_json() == []
+
+        assert client.get('/tasks/search?q=', headers=auth_headers).status_code == 400
+
+
+class TestTaskBatchEndpoint:
+    """Test the bulk task endpoint."""
+
+    @pytest.mark.crud
+    def test_batch_applies_each_operation(self, client, auth_headers, sample_task_data):
+        """Test a mixed batch with per-item results."""
+        response = client.post('/tasks/batch', json={'operations': [
+            {'op': 'create', 'data': sample_task_data},
+            {'op': 'update', 'id': 1, 'data': {'status': 'completed'}},
+            {'op': 'delete', 'id': 999},
+            {'op': 'create', 'data': {'description': 'No title'}},
+        ]}, headers=auth_headers)
+
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert [result['status'] for result in results] == [201, 200, 404, 400]
+        assert results[1]['body']['completed_at'] is not None
+
+        response = client.get('/tasks', headers=auth_headers)
+        assert len(response.get_json()) == 2
+
+    @pytest.mark.crud
+    def test_batch_atomic_rolls_back(self, client, auth_headers, logged_in_user_2, sample_task_data):
+        """Test that an atomic batch applies nothing when one operation fails."""
+        response = client.post('/tasks/batch', json={'atomic': True, 'operations': [
+            {'op': 'create', 'data': sample_task_data},
+            {'op': 'update', 'id': 2, 'data': {'status': 'completed'}},
+            {'op': 'delete', 'id': 2},  # Only the creator (user 1) may delete
+        ]}, headers=logged_in_user_2)
+
+        assert response.status_code == 400
+        data = response.get_json()
+        assert data['committed'] is False
+        assert [result['status'] for result in data['results']] == [409, 409, 403]
+
+        response = client.get('/tasks', headers=logged_in_user_2)
+        tasks = response.get_json()
+        assert [task['id'] for task in tasks] == [2]
+        assert tasks[0]['status'] == 'todo'
+
+
+class TestConditionalGet:
+    """Test ETags and 304 responses on the read endpoints."""
+
+    @pytest.mark.crud
+    @pytest.mark.parametrize('path', ['/tasks', '/projects', '/users/profile', '/analytics/dashboard'])
+    def test_unchanged_resource_returns_304(self, client, auth_headers, path):
+        """Test that a matching If-None-Match is answered without a body."""
+        response = client.get(path, headers=auth_headers)
+        etag = response.headers['ETag']
+
+        response = client.get(path, headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+
+    @pytest.mark.crud
+    def test_etag_follows_writes(self, client, auth_headers, logged_in_user_2, sample_task_data):
+        """Test that writes touching the caller's data change their ETags."""
+        tasks_etag = client.get('/tasks', headers=auth_headers).headers['ETag']
+        projects_etag = client.get('/projects', headers=auth_headers).headers['ETag']
+
+        # User 2's task lands in user 1's project, so its task count changes
+        client.post('/tasks', json={**sample_task_data, 'project_id': 2}, headers=logged_in_user_2)
+        response = client.get('/projects', headers={**auth_headers, 'If-None-Match': projects_etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != projects_etag
+
+        client.post('/tasks', json=sample_task_data, headers=auth_headers)
+        response = client.get('/tasks', headers={**auth_headers, 'If-None-Match': tasks_etag})
+        assert response.status_code == 200
+        assert len(response.get_json()) == 2
+
+    @pytest.mark.crud
+    @pytest.mark.skipif(os.environ.get('STORAGE_URL', '').startswith(('sqlite:', 'shm:')),
+                        reason="SQLite tables keep a single table-wide version")
+    def test_etag_ignores_other_users_writes(self, client, auth_headers, logged_in_user_2):
+        """Test that another user's task write keeps the caller's task list cached."""
+        etag = client.get('/tasks', headers=auth_headers).headers['ETag']
+
+        client.put('/tasks/2', json={'status': 'in_progress'}, headers=logged_in_user_2)
+        response = client.get('/tasks', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+
+
+class TestResponseEncoding:
+    """Test JSON encoding and response compression."""
+
+    @pytest.fixture
+    def many_tasks(self, client, auth_headers, sample_task_data):
+        client.post('/tasks/batch', json={'operations': [
+            {'op': 'create', 'data': sample_task_data} for _ in range(50)
+        ]}, headers=auth_headers)
+
+    @pytest.mark.api
+    @pytest.mark.parametrize('encoding, decompress', [
+        ('gzip', gzip.decompress),
+        ('deflate', zlib.decompress),
+    ])
+    def test_large_response_is_compressed(self, client, auth_headers, many_tasks, encoding, decompress):
+        """Test that a large body is compressed with the encoding the client accepts."""
+        plain = client.get('/tasks', headers=auth_headers)
+        response = client.get('/tasks', headers={**auth_headers, 'Accept-Encoding': encoding})
+
+        assert plain.headers.get('Content-Encoding') is None
+        assert response.headers['Content-Encoding'] == encoding
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(response.data) < len(plain.data)
+        assert json.loads(decompress(response.data)) == plain.get_json()
+
+        # The compressed response's weak ETag still revalidates
+        response = client.get('/tasks', headers={**auth_headers, 'Accept-Encoding': encoding,
+                                                 'If-None-Match': response.headers['ETag']})
+        assert response.status_code == 304
+
+    @pytest.mark.api
+    def test_small_and_streamed_responses(self, client, auth_headers, many_tasks):
+        """Test that small bodies are sent as is and streams are compressed incrementally."""
+        headers = {**auth_headers, 'Accept-Encoding': 'gzip'}
+        response = client.get('/users/profile', headers=headers)
+        assert response.headers.get('Content-Encoding') is None
+
+        response = client.get('/tasks?stream=ndjson', headers=headers)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        lines = gzip.decompress(response.data).decode().splitlines()
+        assert len(lines) == 51
+
+    @pytest.mark.api
+    def test_stdlib_fallback_matches(self, client, auth_headers, monkeypatch):
+        """Test that the stdlib encoder produces the same documents as the fast one."""
+        fast = client.get('/tasks', headers=auth_headers).get_json()
+        monkeypatch.setattr(app_module, 'orjson', None)
+        assert client.get('/tasks', headers=auth_headers).get_json() == fast
+
+    @pytest.mark.api
+    def test_integers_beyond_64_bits(self, client, auth_headers):
+        """Test that values the fast encoder refuses are still encoded."""
+        big = 2 ** 70
+        response = client.post('/tasks', json={'title': big}, headers=auth_headers)
+        assert response.status_code == 201
+        assert response.get_json()['title'] == big
+
+        response = client.get('/tasks?stream=ndjson', headers=auth_headers)
+        assert json.loads(response.data.splitlines()[-1])['title'] == big
+        response = client.get('/tasks', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.get_json()[-1]['title'] == big
+
+
+class TestConcurrency:
+    """Test the store under concurrent requests."""
+
+    @pytest.mark.slow
+    def test_concurrent_writes_keep_indexes_consistent(self, client, auth_headers, sample_task_data):
+        """Test that parallel creates, updates and reads leave consistent indexes."""
+        errors = []
+
+        def worker():
+            try:
+                thread_client = client.application.test_client()
+                for i in range(25):
+                    response = thread_client.post('/tasks', json=sample_task_data, headers=auth_headers)
+                    task_id = response.get_json()['id']
+                    thread_client.put(f'/tasks/{task_id}', json={'status': 'done' if i % 2 else 'todo'},
+                               headers=auth_headers)
+                    assert thread_client.get('/tasks?status=todo&limit=10', headers=auth_headers).status_code == 200
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        all_tasks = client.get('/tasks', headers=auth_headers).get_json()
+        assert len({task['id'] for task in all_tasks}) == 201
+        data = client.get('/analytics/dashboard', headers=auth_headers).get_json()
+        assert data['status_distribution'] == dict(Counter(task['status'] for task in all_tasks))
+        assert data['status_distribution']['done'] == 8 * 12
+
+
+    @pytest.mark.unit
+    def test_table_locks_are_nested_in_one_order(self, client, auth_headers, monkeypatch):
+        """Test that every reader of several tables locks them users, tasks, projects."""
+        order = ['users', 'tasks', 'projects']
+        if len({id(getattr(app_module, name).lock) for name in order}) < len(order):
+            pytest.skip("the tables share one lock")
+        acquired = []
+        for name in order:
+            lock = getattr(app_module, name).lock
+            monkeypatch.setattr(lock, 'read', lambda read=lock.read, name=name: acquired.append(name) or read())
+
+        readers = [app_module.project_list_version, app_module.profile_version,
+                   app_module.dashboard_version, lambda user_id: client.get('/')]
+        for reader in readers:
+            acquired.clear()
+            app_module.dashboard_cache["entry"] = (None, None)
+            reader(1)
+            first = list(dict.fromkeys(acquired))
+            assert len(first) > 1 and first == sorted(first, key=order.index)
+
+
+def read_events(chunks):
+    """Parse the next chunk of an event stream into (id, event, data) tuples."""
+    events = []
+    for block in next(chunks).decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestEventStream:
+    """Test the Server-Sent Events change feed."""
+
+    @pytest.fixture
+    def open_stream(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'EVENTS_KEEPALIVE', 0.01)
+        responses = []
+
+        def open_stream(headers):
+            response = client.get('/events', headers=headers, buffered=False)
+            responses.append(response)
+            chunks = response.iter_encoded()
+            assert next(chunks).startswith(b"retry: ")
+            return chunks
+
+        yield open_stream
+        for response in responses:
+            response.close()
+
+    @pytest.mark.api
+    def test_task_and_project_changes_are_pushed(self, client, auth_headers, open_stream, sample_task_data):
+        """Test that creates, updates and deletes reach the stream in order."""
+        chunks = open_stream(auth_headers)
+
+        task_id = client.post('/tasks', json=sample_task_data, headers=auth_headers).get_json()['id']
+        client.put(f'/tasks/{task_id}', json={'status': 'completed'}, headers=auth_headers)
+        client.delete(f'/tasks/{task_id}', headers=auth_headers)
+        client.put('/projects/1', json={'name': 'Renamed'}, headers=auth_headers)
+
+        events = read_events(chunks)
+        assert [(name, data['id']) for _, name, data in events] == [
+            ('task.created', task_id), ('task.updated', task_id), ('task.deleted', task_id),
+            ('project.updated', 1)]
+        assert events[1][2]['status'] == 'completed'
+        assert app_module.event_hub.subscriber_count() == 1
+
+    @pytest.mark.api
+    def test_events_only_reach_their_users(self, client, auth_headers, logged_in_user_2, open_stream,
+                                           sample_task_data):
+        """Test that another user sees a task only once it is assigned to them."""
+        chunks = open_stream(logged_in_user_2)
+        private = {**sample_task_data, 'project_id': None}
+
+        task_id = client.post('/tasks', json=private, headers=auth_headers).get_json()['id']
+        assert next(chunks) == b": keepalive\n\n"
+
+        client.put(f'/tasks/{task_id}', json={'assigned_to': 2}, headers=auth_headers)
+        assert [name for _, name, _ in read_events(chunks)] == ['task.updated']
+
+    @pytest.mark.api
+    def test_resume_from_last_event_id(self, client, auth_headers, open_stream, sample_task_data):
+        """Test that a reconnecting client receives exactly the events it missed."""
+        chunks = open_stream(auth_headers)
+        client.post('/tasks', json=sample_task_data, headers=auth_headers)
+        last_event_id = read_events(chunks)[0][0]
+        missed = [client.post('/tasks', json=sample_task_data, headers=auth_headers).get_json()['id']
+                  for _ in range(2)]
+
+        chunks = open_stream({**auth_headers, 'Last-Event-ID': last_event_id})
+        assert [data['id'] for _, _, data in read_events(chunks)] == missed
+
+        chunks = open_stream({**auth_headers, 'Last-Event-ID': 'from-another-process-1'})
+        assert [name for _, name, _ in read_events(chunks)] == ['reset']
+
+    @pytest.mark.api
+    def test_failed_writes_publish_nothing(self, client, auth_headers, open_stream, sample_task_data):
+        """Test that a rolled-back atomic batch sends no events."""
+        chunks = open_stream(auth_headers)
+
+        response = client.post('/tasks/batch', json={'atomic': True, 'operations': [
+            {'op': 'create', 'data': sample_task_data},
+            {'op': 'delete', 'id': 999999},
+        ]}, headers=auth_headers)
+
+        assert response.status_code == 400
+        assert next(chunks) == b": keepalive\n\n"
+
+    @pytest.mark.unit
+    def test_slow_subscriber_gets_reset(self):
+        """Test that a full buffer is dropped in favour of a single reset event."""
+        hub = EventHub(history=10, buffer_size=2)
+        subscription = hub.subscribe(1)
+        ids = [hub.publish('task.updated', '{}', [1, 2]) for _ in range(3)]
+
+        events = subscription.wait(0)
+        assert [(event.id, event.name) for event in events] == [(ids[-1], 'reset')]
+        hub.publish('task.updated', '{}', [1])
+        assert [event.name for event in subscription.wait(0)] == ['task.updated']
+
+        subscription.close()
+        assert hub.subscriber_count() == 0
+        assert [event.name for event in hub.subscribe(1, ids[-1]).wait(0)] == ['task.updated']
+        # Older than the history: only a reset is possible
+        for _ in range(10):
+            hub.publish('task.updated', '{}', [2])
+        assert [event.name for event in hub.subscribe(1, ids[-1]).wait(0)] == ['reset']
+
+
+def asgi_request(method, path, headers=None, body=b"", until=None):
+    """Drive ``asgi.app`` for one request; stop streaming once ``until`` returns True.
+
+    Returns the status, the headers and the body chunks sent.
+    """
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "http_version": "1.1", "method": method, "path": path,
+             "query_string": query.encode(), "root_path": "", "scheme": "http",
+             "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+             "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+    sent = []
+
+    async def run():
+        disconnect = asyncio.Event()
+        requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if until is not None and until(sent):
+                disconnect.set()
+
+        await asyncio.wait_for(asgi.app(scope, receive, send), 5)
+
+    asyncio.run(run())
+    status = sent[0]["status"]
+    headers = {name.decode(): value.decode() for name, value in sent[0]["headers"]}
+    return status, headers, [message.get("body", b"") for message in sent[1:]]
+
+
+class TestASGI:
+    """Test the ASGI entry point against the same app and store."""
+
+    @pytest.mark.api
+    def test_requests_reach_the_flask_handlers(self, client, auth_headers, sample_task_data):
+        """Test that a write through ASGI is visible to the WSGI app and vice versa."""
+        status, headers, body = asgi_request('POST', '/tasks', {**auth_headers, 'Content-Type': 'application/json'},
+                                             json.dumps(sample_task_data).encode())
+        assert status == 201
+        task_id = json.loads(b"".join(body))['id']
+        assert client.get('/tasks?limit=1000', headers=auth_headers).get_json()[-1]['id'] == task_id
+
+        status, headers, body = asgi_request('GET', '/tasks?stream=ndjson&fields=id', auth_headers)
+        assert headers['content-type'] == 'application/x-ndjson'
+        assert [json.loads(line)['id'] for line in b"".join(body).splitlines()] == [
+            task['id'] for task in client.get('/tasks?limit=1000', headers=auth_headers).get_json()]
+
+    @pytest.mark.api
+    def test_events_stream_on_the_event_loop(self, client, auth_headers, sample_task_data, monkeypatch):
+        """Test that the native /events handler delivers writes and cleans up on disconnect."""
+        monkeypatch.setattr(app_module, 'EVENTS_KEEPALIVE', 0.05)
+        writer = threading.Timer(0.2, client.application.test_client().post, args=('/tasks',),
+                                 kwargs={'json': sample_task_data, 'headers': auth_headers})
+        writer.start()
+
+        status, headers, body = asgi_request(
+            'GET', '/events', auth_headers, until=lambda sent: b"task.created" in sent[-1].get("body", b""))
+        writer.join()
+
+        assert status == 200
+        assert headers['content-type'].startswith('text/event-stream')
+        stream = b"".join(body).decode()
+        assert stream.startswith("retry: 3000") and ": keepalive" in stream
+        assert "event: task.created" in stream
+        assert app_module.event_hub.subscriber_count() == 0
+
+    @pytest.mark.auth
+    def test_events_require_auth(self):
+        """Test that the native /events handler rejects a missing token like the Flask app."""
+        status, _, body = asgi_request('GET', '/events')
+        assert status == 401
+        assert json.loads(b"".join(body)) == {"error": "Authentication required"}
+
+
+def http(port, method, path, token=None, body=None):
+    """Make a request to a live server; return the open response."""
+    request = Request(f'http://127.0.0.1:{port}{path}', method=method,
+                      data=None if body is None else json.dumps(body).encode(),
+                      headers={'Content-Type': 'application/json'})
+    if token:
+        request.add_header('Authorization', token)
+    return urlopen(request, timeout=10)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/task'), reason="needs fork and /proc")
+class TestServe:
+    """Test the prefork production server in serve.py."""
+
+    @pytest.fixture
+    def serve(self):
+        processes = []
+
+        def serve(port, storage_url, *args):
+            env = dict(os.environ, STORAGE_URL=storage_url, AUTH_TOKEN_MODE='signed')
+            process = subprocess.Popen([sys.executable, 'serve.py', '--port', str(port), *args], env=env,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            processes.append(process)
+            for _ in range(100):
+                try:
+                    http(port, 'GET', '/').close()
+                    return process
+                except URLError:
+                    time.sleep(0.1)
+            raise RuntimeError("serve.py did not start")
+
+        yield serve
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        for suffix in ('', '-wal', '-shm'):
+            path = f'/dev/shm/test-serve-{os.getpid()}.db{suffix}'
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def workers(process):
+        with open(f'/proc/{process.pid}/task/{process.pid}/children') as children:
+            return set(children.read().split())
+
+    @staticmethod
+    def login(port):
+        with http(port, 'POST', '/auth/login', body={
+                'email': 'pradnya@example.com', 'password': 'password123'}) as response:
+            return json.load(response)['token']
+
+    @pytest.mark.integration
+    @pytest.mark.slow
+    def test_rolling_restart_under_load(self, serve):
+        """Test that SIGHUP replaces every worker without failing a request."""
+        port = 5211
+        process = serve(port, f'shm://test-serve-{os.getpid()}', '--workers', '2', '--threads', '4')
+        token = self.login(port)
+        http(port, 'POST', '/tasks', token, {'title': 'Before restart'}).close()
+        original = self.workers(process)
+        assert len(original) == 2
+
+        statuses = []
+        stop = threading.Event()
+
+        def load():
+            while not stop.is_set():
+                try:
+                    with http(port, 'GET', '/tasks?limit=5', token) as response:
+                        statuses.append(response.status)
+                except OSError as error:
+                    statuses.append(repr(error))
+
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        process.send_signal(signal.SIGHUP)
+        for _ in range(100):
+            if len(self.workers(process)) == 2 and not self.workers(process) & original:
+                break
+            time.sleep(0.1)
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        assert not self.workers(process) & original
+        assert len(statuses) > 50 and set(statuses) == {200}
+        with http(port, 'GET', '/tasks?fields=title', token) as response:
+            assert {'title': 'Before restart'} in json.load(response)
+
+    @pytest.mark.integration
+    def test_sigterm_drains_and_exits(self, serve):
+        """Test that SIGTERM ends open event streams and stops the server cleanly."""
+        port = 5212
+        process = serve(port, 'memory://')
+        stream = http(port, 'GET', '/events', self.login(port))
+        assert stream.read1().startswith(b'retry: ')
+
+        process.send_signal(signal.SIGTERM)
+
+        assert process.wait(timeout=10) == 0
+        assert stream.read() == b''
+
+    @pytest.mark.unit
+    def test_in_process_storage_refuses_several_workers(self):
+        """Test that memory:// storage cannot be split across worker processes."""
+        result = subprocess.run([sys.executable, 'serve.py', '--workers', '2', '--port', '5213'],
+                                env=dict(os.environ, STORAGE_URL='memory://'), capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert result.returncode != 0
+        assert 'sqlite:// or shm://' in result.stderr
+
+
 class TestAnalyticsEndpoints:
     """Test analytics and dashboard endpoints."""
 
@@ -257,6 +1069,41 @@ class TestAnalyticsEndpoints:
         assert 'completion_rate' in data
         assert isinstance(data['completion_rate'], (int, float))
 
+    @pytest.mark.api
+    def test_dashboard_analytics_tracks_task_changes(self, client, auth_headers, sample_task_data):
+        """Test that dashboard counters follow task create, update and delete."""
+        client.post('/tasks', json=sample_task_data, headers=auth_headers)
+        client.put('/tasks/1', json={'status': 'completed'}, headers=auth_headers)
+
+        data = client.get('/analytics/dashboard', headers=auth_headers).get_json()
+        assert data['total_tasks'] == 2
+        assert data['total_projects'] == 2
+        assert data['status_distribution'] == {'completed': 1, 'todo': 1}
+        assert data['priority_distribution'] == {'high': 2}
+        assert data['completion_rate'] == 50
+
+        client.delete('/tasks/1', headers=auth_headers)
+
+        data = client.get('/analytics/dashboard', headers=auth_headers).get_json()
+        assert data['total_tasks'] == 1
+        assert data['status_distribution'] == {'todo': 1}
+        assert data['completion_rate'] == 0
+
+    @pytest.mark.api
+    def test_dashboard_overdue_tasks(self, client, auth_headers):
+        """Test that overdue counts only open tasks past their due date."""
+        yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+        for status in ('todo', 'completed'):
+            client.post('/tasks', json={'title': 'Late', 'status': status, 'due_date': yesterday},
+                        headers=auth_headers)
+
+        data = client.get('/analytics/dashboard', headers=auth_headers).get_json()
+        assert data['overdue_tasks'] == 1
+
+        client.put('/tasks/1', json={'due_date': yesterday}, headers=auth_headers)
+        data = client.get('/analytics/dashboard', headers=auth_headers).get_json()
+        assert data['overdue_tasks'] == 2
+
     @pytest.mark.api
     def test_user_profile(self, client, auth_headers):
         """Test user profile endpoint (GET)."""
@@ -285,6 +1132,28 @@ class TestAuthorizationAndSecurity:
         data = response.get_json()
         assert data['error'] == 'Authentication required'
 
+    @pytest.mark.auth
+    def test_deleting_user_revokes_sessions(self, client, auth_headers):
+        """Test that a deleted user's tokens stop working immediately."""
+        client.delete('/users/1')
+
+        response = client.get('/users/profile', headers=auth_headers)
+        assert response.status_code == 401
+
+    @pytest.mark.auth
+    def test_deactivating_user_revokes_sessions(self, client, logged_in_user_2):
+        """Test that deactivating a user ends their sessions and blocks login."""
+        client.put('/users/2', json={'is_active': False})
+
+        response = client.get('/users/profile', headers=logged_in_user_2)
+        assert response.status_code == 401
+
+        response = client.post('/auth/login', json={
+            'email': 'john@example.com',
+            'password': 'password123'
+        })
+        assert response.status_code == 403
+
     @pytest.mark.auth
     def test_update_other_users_task_forbidden(self, client, logged_in_user_2):
         """Test that users cannot update tasks they don't own."""
@@ -310,6 +1179,62 @@ class TestAuthorizationAndSecurity:
         assert data['error'] == 'Not authorized'
 
 
+class TestSignedTokens:
+    """Test the stateless signed-token auth mode."""
+
+    @pytest.fixture(autouse=True)
+    def signed_mode(self, monkeypatch):
+        monkeypatch.setitem(app.config, 'AUTH_TOKEN_MODE', 'signed')
+
+    @pytest.mark.auth
+    def test_signed_token_needs_no_session(self, client, auth_headers):
+        """Test that a signed token is verified without the session store."""
+        sessions.clear()
+
+        response = client.get('/users/profile', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.get_json()['user']['id'] == 1
+
+    @pytest.mark.auth
+    def test_tampered_and_expired_tokens_rejected(self, client, auth_headers, monkeypatch):
+        """Test that a modified or expired token is refused."""
+        _, rest = auth_headers['Authorization'].split('.', 1)
+        response = client.get('/users/profile', headers={'Authorization': f'2.{rest}'})
+        assert response.status_code == 401
+        response = client.get('/users/profile', headers={'Authorization': '1.2.3.\u00e9'})
+        assert response.status_code == 401
+
+        monkeypatch.setattr(token_signer, 'clock', lambda: time.time() + 2 * 24 * 60 * 60)
+        response = client.get('/users/profile', headers=auth_headers)
+        assert response.status_code == 401
+
+    @pytest.mark.auth
+    def test_logout_revokes_signed_token(self, client, auth_headers):
+        """Test that logging out puts the token on the revocation list."""
+        client.post('/auth/logout', headers=auth_headers)
+
+        response = client.get('/users/profile', headers=auth_headers)
+        assert response.status_code == 401
+
+    @pytest.mark.auth
+    def test_revocation_list_drops_expired_entries(self, monkeypatch):
+        """Test that revoking a token prunes the entries of tokens that have since expired."""
+        now = [time.time()]
+        monkeypatch.setattr(token_signer, 'clock', lambda: now[0])
+        expired = [token_signer.issue(1) for _ in range(3)]
+        for token in expired:
+            token_signer.revoke(token)
+
+        now[0] += token_signer.ttl + 1
+        live = token_signer.issue(1)
+        token_signer.revoke(live)
+
+        nonce = lambda token: int(token.split('.')[2])
+        assert not any(nonce(token) in app_module.revoked_tokens for token in expired)
+        assert nonce(live) in app_module.revoked_tokens
+        assert token_signer.verify(live) is None
+
+
 class TestErrorHandling:
     """Test error handling and edge cases."""
 
@@ -338,6 +1263,27 @@ class TestErrorHandling:
         data = response.get_json()
         assert data['error'] == 'Email already exists'
 
+    @pytest.mark.api
+    def test_update_user_duplicate_email(self, client):
+        """Test changing a user's email to one already in use."""
+        response = client.put('/users/2', json={'email': 'pradnya@example.com'})
+
+        assert response.status_code == 400
+        data = response.get_json()
+        assert data['error'] == 'Email already exists'
+
+    @pytest.mark.api
+    def test_deleted_user_email_can_be_reused(self, client):
+        """Test that deleting a user frees their email."""
+        client.delete('/users/2')
+        response = client.post('/users', json={
+            'name': 'New John',
+            'email': 'john@example.com',
+            'password': 'password123'
+        })
+
+        assert response.status_code == 201
+
     @pytest.mark.api
     def test_get_nonexistent_user(self, client):
         """Test getting non-existent user."""
@@ -362,6 +1308,23 @@ class TestErrorHandling:
         data = response.get_json()
         assert data['error'] == 'Invalid project'
 
+    @pytest.mark.api
+    def test_task_fields_of_the_wrong_type_are_rejected(self, client, auth_headers):
+        """Test that badly typed task fields get a 400 and leave the task untouched."""
+        bad_fields = [{'priority': ['x']}, {'status': {}}, {'assigned_to': [1]}, {'project_id': [1]}]
+        for fields in bad_fields:
+            response = client.put('/tasks/1', json=fields, headers=auth_headers)
+            assert response.status_code == 400
+            response = client.post('/tasks', json={'title': 'Typed', **fields}, headers=auth_headers)
+            assert response.status_code == 400
+
+        response = client.put('/tasks/1', json={'priority': 'low'}, headers=auth_headers)
+        assert response.status_code == 200
+        response = client.get('/tasks?priority=low', headers=auth_headers)
+        assert [task['id'] for task in response.get_json()] == [1]
+        response = client.get('/tasks?fields=title', headers=auth_headers)
+        assert {'title': 'Typed'} not in response.get_json()
+
 
 class TestHomeDashboard:
     """Test the home dashboard endpoint."""
@@ -376,4 +1339,17 @@ class TestHomeDashboard:
         assert b'Total Tasks' in response.data
         assert b'Active Projects' in response.data
         assert b'Recent Tasks' in response.data
-        assert b'API Endpoints' in response.data
\ No newline at end of file
+        assert b'API Endpoints' in response.data
+
+    @pytest.mark.api
+    def test_home_dashboard_reflects_writes(self, client, auth_headers, sample_task_data):
+        """Test that the cached dashboard is refreshed after a write."""
+        response = client.get('/')
+        assert b'Test Task' not in response.data
+        assert client.get('/').data == response.data
+
+        client.post('/tasks', json=sample_task_data, headers=auth_headers)
+
+        response = client.get('/')
+        assert b'Test Task' in response.data
+        assert b'Tasks: 2' in response.data
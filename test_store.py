@@ -0,0 +1,363 @@
+import errno
+import os
+import pickle
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import wal_store
+from records import TaskRecord
+from sqlite_store import shared_memory_path
+from store import CountIndex, HashIndex, SessionStore, SortedIndex, TagIndex, TextIndex, open_backend
+
+
+def make_tasks(backend):
+    return backend.table(
+        "tasks",
+        HashIndex("assigned_to"),
+        HashIndex("status"),
+        CountIndex("assigned_to", "status"),
+        SortedIndex("due_by_assigned_to", "assigned_to", "due"),
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """Run each store test against both storage backends."""
+    if request.param == "memory":
+        yield open_backend("memory://")
+    else:
+        backend = open_backend(f"sqlite:///{tmp_path / 'store.db'}")
+        yield backend
+        backend.close()
+
+
+class TestTableBackends:
+    """Test that every backend honours the Table interface."""
+
+    @pytest.mark.unit
+    def test_queries_follow_writes(self, backend):
+        """Test page, count and the derived indexes after insert, patch and pop."""
+        tasks = make_tasks(backend)
+        for pk in range(1, 6):
+            tasks[pk] = {"id": pk, "assigned_to": pk % 2, "status": "todo", "due": pk * 10}
+
+        assert [task["id"] for task in tasks.page({"assigned_to": 1}, after=1, limit=1)] == [3]
+        assert tasks.count(assigned_to=1, status="todo") == 3
+
+        tasks.patch(3, {"status": "done"})
+        tasks.pop(5)
+
+        assert tasks.indexes["status_by_assigned_to"].counts(1) == {"todo": 1, "done": 1}
+        assert list(tasks.indexes["due_by_assigned_to"].range(1, after=10)) == [3]
+        assert tasks.indexes["due_by_assigned_to"].count_before(0, 40) == 1
+        assert [task["id"] for task in tasks.filter([4, 1, 2], {"assigned_to": 0})] == [4, 2]
+
+    @pytest.mark.unit
+    def test_version_and_id_sequence(self, backend):
+        """Test that writes bump the version and ids are never reused."""
+        tasks = make_tasks(backend)
+        tasks.update({1: {"id": 1, "assigned_to": 1, "status": "todo"}})
+        version = tasks.version
+
+        new_id = tasks.next_id()
+        tasks[new_id] = {"id": new_id, "assigned_to": 1, "status": "todo"}
+        del tasks[new_id]
+
+        assert new_id == 2
+        assert tasks.next_id() == 3
+        assert tasks.version > version
+
+    @pytest.mark.unit
+    def test_rejected_write_changes_nothing(self, backend):
+        """Test that a value the indexes cannot hold leaves the record and indexes as they were."""
+        tasks = make_tasks(backend)
+        tasks[1] = {"id": 1, "assigned_to": 1, "status": "todo", "due": 10}
+
+        with pytest.raises(Exception):
+            tasks[1] = {"id": 1, "assigned_to": 1, "status": {}, "due": 10}
+        with pytest.raises(Exception):
+            tasks[2] = {"id": 2, "assigned_to": [1], "status": "todo"}
+
+        assert list(tasks) == [1] and tasks[1]["status"] == "todo"
+        assert tasks.count(assigned_to=1, status="todo") == 1
+        assert tasks.indexes["status_by_assigned_to"].counts(1) == {"todo": 1}
+        tasks.patch(1, {"status": "done"})
+        assert tasks.indexes["status_by_assigned_to"].counts(1) == {"done": 1}
+
+
+    @pytest.mark.unit
+    def test_sorted_scan_resumes_in_either_direction(self, backend):
+        """Test ordered range scans from a (key, id) cursor, with missing keys sorted last."""
+        tasks = backend.table("tasks", SortedIndex("due", "assigned_to", "due", missing=float("inf")))
+        for pk, due in [(1, 30), (2, 10), (3, None), (4, 10), (5, 20)]:
+            tasks[pk] = {"id": pk, "assigned_to": 1, "due": due}
+        due = tasks.indexes["due"]
+
+        assert list(due.range(1)) == [2, 4, 5, 1, 3]
+        assert list(due.range(1, reverse=True)) == [3, 1, 5, 4, 2]
+        assert list(due.range(1, start=(10, 2))) == [4, 5, 1, 3]
+        assert list(due.range(1, before=float("inf"), reverse=True, start=(30, 1))) == [5, 4, 2]
+
+    @pytest.mark.unit
+    def test_text_search(self, backend):
+        """Test ranked, prefix-matching search as records change."""
+        notes = backend.table("notes", TextIndex("text", {"title": 3, "tags": 2, "body": 1}))
+        notes[1] = {"id": 1, "title": "Write release notes", "body": "", "tags": ["docs"]}
+        notes[2] = {"id": 2, "title": "Fix login", "body": "Release blocker", "tags": []}
+        notes[3] = {"id": 3, "title": "Plan offsite", "body": "", "tags": ["team"]}
+        search = notes.indexes["text"].search
+
+        assert [pk for pk, _ in search("release")] == [1, 2]  # Title outranks body
+        assert [pk for pk, _ in search("rel not")] == [1]
+        assert [pk for pk, _ in search("release", candidates={2, 3})] == [2]
+
+        notes.patch(1, {"title": "Write changelog"})
+        del notes[2]
+        assert search("release") == []
+        assert [pk for pk, _ in search("DOC")] == [1]
+
+
+    @pytest.mark.unit
+    def test_tag_index(self, backend):
+        """Test per-group tag lookups and counts as tags are replaced and records removed."""
+        tasks = backend.table("tasks", TagIndex("assigned_to", "tags"))
+        tasks[1] = {"id": 1, "assigned_to": 1, "tags": ["work", "urgent"]}
+        tasks[2] = {"id": 2, "assigned_to": 1, "tags": ["work", "work"]}
+        tasks[3] = {"id": 3, "assigned_to": 2, "tags": ["work"]}
+        tags = tasks.indexes["tags_by_assigned_to"]
+
+        assert list(tags.lookup(1, "work")) == [1, 2]
+        assert tags.counts(1) == {"work": 2, "urgent": 1}
+
+        tasks.patch(1, {"tags": ["home"]})
+        del tasks[2]
+        assert list(tags.lookup(1, "work")) == []
+        assert tags.counts(1) == {"home": 1}
+        assert tags.counts(2) == {"work": 1}
+
+
+class TestSQLiteBackend:
+    """Test SQLite-specific persistence."""
+
+    @pytest.mark.integration
+    def test_index_added_to_an_existing_table(self, tmp_path):
+        """Test that an index declared after the table was created covers the stored records."""
+        url = f"sqlite:///{tmp_path / 'store.db'}"
+        first = open_backend(url)
+        first.table("revoked")[1] = {"id": 1, "revoked": True, "expires": 20}
+        first.commit()
+        first.close()
+
+        second = open_backend(url)
+        revoked = second.table("revoked", SortedIndex("expires", "revoked", "expires"))
+        revoked[2] = {"id": 2, "revoked": True, "expires": 10}
+
+        assert list(revoked.indexes["expires"].range(True)) == [2, 1]
+        second.close()
+
+    @pytest.mark.integration
+    def test_data_survives_reopen(self, tmp_path):
+        """Test that a second backend on the same file sees earlier writes."""
+        url = f"sqlite:///{tmp_path / 'store.db'}"
+        first = open_backend(url)
+        make_tasks(first)[1] = {"id": 1, "assigned_to": 7, "status": "todo"}
+        first.close()
+
+        tasks = make_tasks(open_backend(url))
+        assert tasks.find(assigned_to=7) == [{"id": 1, "assigned_to": 7, "status": "todo"}]
+        assert tasks.next_id() == 2
+
+    @pytest.mark.integration
+    def test_shared_memory_writes_are_seen_by_other_processes(self, tmp_path):
+        """Test that a write from another process shows up in an open shm:// backend."""
+        name = f"test-store-{os.getpid()}-{tmp_path.name}"
+        backend = open_backend(f"shm://{name}")
+        try:
+            tasks = make_tasks(backend)
+            tasks[1] = {"id": 1, "assigned_to": 7, "status": "todo"}
+            subprocess.run([sys.executable, "-c", (
+                "import test_store, store\n"
+                f"tasks = test_store.make_tasks(store.open_backend('shm://{name}'))\n"
+                "tasks.patch(1, {'status': 'done'})\n"
+                "tasks[2] = {'id': 2, 'assigned_to': 7, 'status': 'todo'}\n"
+            )], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+            assert [task["status"] for task in tasks.find(assigned_to=7)] == ["done", "todo"]
+            assert tasks.indexes["status_by_assigned_to"].counts(7) == {"done": 1, "todo": 1}
+            assert backend.pool.get().execute("PRAGMA mmap_size").fetchone()[0] > 0
+        finally:
+            backend.close()
+            for suffix in ("", "-wal", "-shm"):
+                path = shared_memory_path(name) + suffix
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @pytest.mark.unit
+    def test_shared_memory_name_is_a_plain_file_name(self):
+        """Test that shm:// rejects names that would leave the shared-memory directory."""
+        with pytest.raises(ValueError):
+            open_backend("shm://../tasks")
+        with pytest.raises(ValueError):
+            open_backend("shm://")
+
+
+class TestWALBackend:
+    """Test restarts of the log-backed in-memory backend."""
+
+    def reopen(self, directory, backend=None):
+        if backend is not None:
+            backend.commit()
+            backend.close()
+        backend = open_backend(f"wal:///{directory}")
+        return backend, make_tasks(backend)
+
+    @pytest.mark.integration
+    def test_restart_replays_snapshot_and_log(self, tmp_path):
+        """Test that a restart restores records, indexes and ids from a snapshot plus the log tail."""
+        backend, tasks = self.reopen(tmp_path)
+        tasks.update({pk: {"id": pk, "assigned_to": pk % 2, "status": "todo", "due": pk} for pk in range(1, 6)})
+        backend.snapshot()
+        tasks.patch(2, {"status": "done"})
+        tasks.pop(5)
+        tasks[tasks.next_id()] = {"id": 6, "assigned_to": 0, "status": "todo", "due": 0}
+
+        backend, tasks = self.reopen(tmp_path, backend)
+
+        assert sorted(tasks) == [1, 2, 3, 4, 6]
+        assert tasks.indexes["status_by_assigned_to"].counts(0) == {"done": 1, "todo": 2}
+        assert list(tasks.indexes["due_by_assigned_to"].range(0)) == [6, 2, 4]
+        assert tasks.next_id() == 7
+        assert [name for name in os.listdir(tmp_path) if name.startswith("snapshot")] == ["snapshot-00000002"]
+
+    @pytest.mark.integration
+    def test_index_with_a_changed_key_is_rebuilt(self, tmp_path):
+        """Test that snapshot index data is only reused while the index's key function is unchanged."""
+        backend = open_backend(f"wal:///{tmp_path}")
+        tasks = backend.table("tasks", SortedIndex("rank", "assigned_to", "rank", key=lambda rank: rank))
+        tasks.update({pk: {"id": pk, "assigned_to": 1, "rank": pk} for pk in range(1, 4)})
+        backend.snapshot()
+        backend.close()
+
+        backend = open_backend(f"wal:///{tmp_path}")
+        tasks = backend.table("tasks", SortedIndex("rank", "assigned_to", "rank", key=lambda rank: -rank))
+
+        assert list(tasks.indexes["rank"].range(1)) == [3, 2, 1]
+        backend.close()
+
+    @pytest.mark.integration
+    def test_torn_log_tail_is_ignored(self, tmp_path):
+        """Test that a partly written last entry is skipped and later writes still replay."""
+        backend, tasks = self.reopen(tmp_path)
+        tasks[1] = {"id": 1, "assigned_to": 1, "status": "todo"}
+        backend.commit()
+        with open(backend.log.path, "ab") as log:
+            log.write(b"\x40\x00\x00\x00partial")
+
+        backend, tasks = self.reopen(tmp_path, backend)
+        tasks[2] = {"id": 2, "assigned_to": 1, "status": "todo"}
+        backend, tasks = self.reopen(tmp_path, backend)
+
+        assert sorted(tasks) == [1, 2]
+
+    @pytest.mark.integration
+    def test_failed_flush_is_retried_not_acknowledged(self, tmp_path, monkeypatch):
+        """Test that a batch torn by a write error is cut off and written again by the next commit."""
+        backend, tasks = self.reopen(tmp_path)
+        tasks[1] = {"id": 1, "assigned_to": 1, "status": "todo"}
+        backend.commit()
+
+        def torn_write(fd, data):
+            os.write(fd, data[:len(data) // 2])
+            raise OSError(errno.EIO, "I/O error")
+
+        monkeypatch.setattr(wal_store, "write_all", torn_write)
+        tasks[2] = {"id": 2, "assigned_to": 1, "status": "todo"}
+        with pytest.raises(OSError):
+            backend.commit()
+        monkeypatch.undo()
+        tasks[3] = {"id": 3, "assigned_to": 1, "status": "todo"}
+        backend.commit()
+
+        backend, tasks = self.reopen(tmp_path, backend)
+        assert sorted(tasks) == [1, 2, 3]
+
+    @pytest.mark.integration
+    def test_group_commit_from_many_threads(self, tmp_path):
+        """Test that concurrent writers each see their entries durable after commit."""
+        backend, tasks = self.reopen(tmp_path)
+
+        def write(start):
+            for pk in range(start, start + 50):
+                tasks[pk] = {"id": pk, "assigned_to": 1, "status": "todo"}
+                backend.commit()
+
+        threads = [threading.Thread(target=write, args=(start,)) for start in range(1, 400, 50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        backend, tasks = self.reopen(tmp_path, backend)
+        assert len(tasks) == 400
+
+
+class TestTaskRecord:
+    """Test the compact task representation."""
+
+    @pytest.mark.unit
+    def test_round_trips_task_dict(self):
+        """Test that a record reads back exactly like the dict it was built from."""
+        task = {
+            "id": 1, "title": "Write docs", "description": "", "project_id": None,
+            "assigned_to": 1, "created_by": 1, "priority": "high", "status": "todo",
+            "due_date": "2025-07-18", "created_at": "2025-07-18T18:28:45.123456",
+            "completed_at": None, "tags": ["docs"], "estimate": 3,
+        }
+        record = TaskRecord(task)
+
+        assert record.to_dict() == task
+        assert list(record) == list(task)
+        assert isinstance(record._created_at, int)
+        assert record._due_date == "2025-07-18"  # Not round-trippable, kept verbatim
+        with pytest.raises(AttributeError):
+            record.status = "done"
+        assert pickle.loads(pickle.dumps(record)).to_dict() == task
+
+
+class TestSessionStore:
+    """Test session expiry, eviction and revocation."""
+
+    @pytest.mark.auth
+    def test_idle_and_absolute_expiry(self):
+        """Test that sessions end after going idle or reaching their maximum age."""
+        now = [0]
+        sessions = SessionStore(idle_ttl=10, absolute_ttl=25, clock=lambda: now[0])
+        token = sessions.create(1)
+
+        now[0] = 9
+        assert sessions.get(token) == 1  # Refreshes the idle timer
+        now[0] = 18
+        assert sessions.get(token) == 1
+        now[0] = 25
+        assert sessions.get(token) is None
+
+        idle = sessions.create(2)
+        now[0] = 36
+        assert sessions.get(idle) is None
+        assert len(sessions) == 0
+
+    @pytest.mark.auth
+    def test_lru_bound_and_user_revocation(self):
+        """Test eviction of the least recently used session and per-user revocation."""
+        sessions = SessionStore(max_size=2)
+        first, second = sessions.create(1), sessions.create(1)
+        sessions.get(first)
+        third = sessions.create(2)
+
+        assert second not in sessions
+        assert sessions.revoke_user(1) == 1
+        assert first not in sessions
+        assert sessions.get(third) == 2
@@ -0,0 +1,79 @@
+"""Stateless, HMAC-signed auth tokens.
+
+A token is ``<user_id>.<expires>.<nonce>.<signature>``. Any process that knows the
+secret key can verify it without a session lookup, so authenticated requests do
+not need sticky sessions. Logging out adds the nonce to a small revocation table
+until the token would have expired anyway.
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+
+from store import SortedIndex
+
+
+def expiry_index():
+    """Index the revocation table needs: its entries ordered by expiry."""
+    return SortedIndex("expires", "revoked", "expires")
+
+
+class TokenSigner:
+    def __init__(self, secret, ttl, revoked, clock=time.time):
+        # ``secret`` is called on every use so a rotated app.secret_key takes effect
+        self.secret = secret
+        self.ttl = ttl
+        self.revoked = revoked
+        self.clock = clock
+
+    def _signature(self, payload):
+        key = self.secret()
+        if isinstance(key, str):
+            key = key.encode()
+        digest = hmac.new(key, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def issue(self, user_id):
+        """Return a signed token for ``user_id`` valid for ``ttl`` seconds."""
+        expires = int(self.clock()) + self.ttl
+        # Nonces double as revocation-table ids, so keep them positive integers
+        nonce = secrets.randbits(62) + 1
+        payload = f"{user_id}.{expires}.{nonce}"
+        return f"{payload}.{self._signature(payload)}"
+
+    def _parse(self, token):
+        # Signed tokens are ASCII; compare_digest refuses other strings
+        if not token.isascii():
+            return None
+        try:
+            payload, signature = token.rsplit('.', 1)
+            user_id, expires, nonce = (int(part) for part in payload.split('.'))
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            return None
+        return user_id, expires, nonce
+
+    def verify(self, token):
+        """Return the user id of a valid, unexpired, unrevoked token, or None."""
+        parsed = self._parse(token)
+        if parsed is None:
+            return None
+        user_id, expires, nonce = parsed
+        if expires <= self.clock() or nonce in self.revoked:
+            return None
+        return user_id
+
+    def revoke(self, token):
+        parsed = self._parse(token)
+        if parsed is None:
+            return
+        _, expires, nonce = parsed
+        # Entries are only needed until their token expires; pruning the
+        # expired ones, which sort first, on each revoke keeps the table as
+        # small as the number of live revoked tokens
+        with self.revoked.lock.write():
+            for pk in list(self.revoked.indexes["expires"].range(True, before=self.clock())):
+                self.revoked.pop(pk, None)
+            self.revoked[nonce] = {"id": nonce, "revoked": True, "expires": expires}
@@ -0,0 +1,413 @@
+"""Durable in-memory storage: a write-ahead log plus periodic snapshots.
+
+Tables are the usual in-memory ``store.Table``; every write also appends a redo
+entry (the full new record, a delete or a clear) to a log of numbered segment
+files. ``commit`` makes the calling thread's entries durable with group commit,
+so concurrent requests share one fsync.
+
+A snapshot rotates the log to a new segment and then saves each table in turn,
+records and index structures alike, so a restart loads it without re-indexing
+and replays only the segments written since. Saving a table may capture writes
+made after the rotation; replaying those again is harmless because every entry
+sets, deletes or clears outright.
+
+The directory belongs to one process at a time.
+"""
+import atexit
+import os
+import pickle
+import re
+import shutil
+import struct
+import threading
+import types
+import zlib
+
+from store import Table
+
+# Log entries between automatic snapshots; 0 turns them off
+SNAPSHOT_EVERY = int(os.environ.get("WAL_SNAPSHOT_EVERY", 100_000))
+
+SET, DELETE, CLEAR = "set", "delete", "clear"
+
+# Each log frame is <payload length><crc32 of payload><pickled entry>
+FRAME_HEADER = struct.Struct("<II")
+
+
+def segment_path(directory, number):
+    return os.path.join(directory, f"log-{number:08d}")
+
+
+def snapshot_path(directory, number):
+    return os.path.join(directory, f"snapshot-{number:08d}")
+
+
+def numbered(directory, prefix):
+    pattern = re.compile(rf"{prefix}-(\d{{8}})$")
+    return sorted(int(match.group(1)) for match in map(pattern.match, os.listdir(directory)) if match)
+
+
+def fsync_directory(directory):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def read_segment(path):
+    """Yield the entries of one log segment, stopping at a torn or corrupt tail."""
+    with open(path, "rb") as file:
+        data = file.read()
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, checksum = FRAME_HEADER.unpack_from(data, offset)
+        payload = data[offset + FRAME_HEADER.size:offset + FRAME_HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return
+        yield pickle.loads(payload)
+        offset += FRAME_HEADER.size + length
+
+
+def const_signature(const):
+    # Nested code objects (lambdas) are described by their code, not their
+    # address, and constant sets in an order that survives hash randomization
+    if isinstance(const, types.CodeType):
+        return code_signature(const)
+    if isinstance(const, frozenset):
+        return sorted(map(repr, const))
+    return repr(const)
+
+
+def code_signature(code):
+    return code.co_code, code.co_names, tuple(map(const_signature, code.co_consts))
+
+
+def callable_signature(function):
+    """Identify a key or filter function by its code, so editing it changes the signature."""
+    code = getattr(function, "__code__", None)
+    if code is not None:
+        return function.__module__, function.__qualname__, code_signature(code)
+    # A builtin, possibly bound to data: PRIORITY_RANKS.get changes with PRIORITY_RANKS
+    owner = getattr(function, "__self__", None)
+    if isinstance(owner, types.ModuleType):
+        owner = owner.__name__
+    return getattr(function, "__qualname__", type(function).__qualname__), repr(owner)
+
+
+def index_signature(index):
+    # Public attributes, functions included, describe what an index holds;
+    # the underscore attributes are its data
+    config = sorted((key, callable_signature(value) if callable(value) else value)
+                    for key, value in vars(index).items() if not key.startswith("_"))
+    return type(index).__name__, repr(config)
+
+
+def table_state(table):
+    return {
+        "version": table.version,
+        "last_id": table.last_id,
+        "records": dict(table),
+        "indexes": {
+            name: (index_signature(index),
+                   {key: value for key, value in vars(index).items() if key.startswith("_")})
+            for name, index in table.indexes.items()
+        },
+    }
+
+
+class WriteAheadLog:
+    """Append-only redo log in numbered segment files, with group commit.
+
+    ``append`` only buffers an entry. ``commit`` returns once everything the
+    calling thread appended is on disk: the first committer writes and fsyncs
+    the whole buffer, and threads arriving meanwhile wait for that fsync or the
+    next one instead of each paying for their own.
+
+    A batch that fails to reach the disk is cut back off the segment and put
+    back in the buffer, so the next commit retries it and no later one can
+    report it durable. If even that fails, every later commit raises.
+    """
+
+    def __init__(self, directory, number, snapshot_every=None, on_full=None):
+        self.directory = directory
+        self.number = number
+        self.snapshot_every = snapshot_every
+        self.on_full = on_full
+        # Entries appended to the current segment
+        self.entries = 0
+        self._open_segment()
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._appended = 0
+        self._durable = 0
+        self._flushing = False
+        self._failed = None
+        self._local = threading.local()
+
+    def _open_segment(self):
+        self.path = segment_path(self.directory, self.number)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        fsync_directory(self.directory)
+
+    def append(self, table, op, pk=None, record=None):
+        payload = pickle.dumps((table, op, pk, record), protocol=pickle.HIGHEST_PROTOCOL)
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._cond:
+            self._buffer.append(frame)
+            self._appended += 1
+            self._local.sequence = self._appended
+            self.entries += 1
+            if self.snapshot_every and self.entries == self.snapshot_every and self.on_full is not None:
+                self.on_full()
+
+    def commit(self):
+        """Wait until every entry this thread appended is durable."""
+        sequence = getattr(self._local, "sequence", 0)
+        with self._cond:
+            while self._durable < sequence:
+                if self._flushing:
+                    self._cond.wait()
+                else:
+                    self._flush()
+
+    def _flush(self):
+        # Called holding the condition; the write and fsync happen without it
+        if self._failed is not None:
+            raise OSError(f"Write-ahead log {self.path} is unusable") from self._failed
+        frames, self._buffer = self._buffer, []
+        target = self._appended
+        self._flushing = True
+        self._cond.release()
+        written = False
+        try:
+            offset = os.lseek(self._fd, 0, os.SEEK_END)
+            try:
+                write_all(self._fd, b"".join(frames))
+                os.fsync(self._fd)
+            except BaseException as error:
+                # A torn frame mid-segment would stop replay there
+                try:
+                    os.ftruncate(self._fd, offset)
+                except OSError:
+                    self._failed = error
+                raise
+            written = True
+        finally:
+            self._cond.acquire()
+            self._flushing = False
+            if not written:
+                self._buffer[:0] = frames
+            self._cond.notify_all()
+        self._durable = target
+
+    def rotate(self):
+        """Flush the current segment and start the next one; return its number."""
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            if self._buffer:
+                self._flush()
+            os.close(self._fd)
+            self.number += 1
+            self.entries = 0
+            self._open_segment()
+            return self.number
+
+    def close(self):
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            if self._buffer:
+                self._flush()
+            os.close(self._fd)
+
+
+class LoggedTable(Table):
+    """A ``store.Table`` that records every write in the backend's log."""
+
+    def __init__(self, name, *indexes, record_type=None):
+        super().__init__(*indexes, record_type=record_type)
+        self.name = name
+        # Attached once the table is restored, so replaying is not logged again
+        self.log = None
+
+    def __setitem__(self, pk, record):
+        with self.lock.write():
+            super().__setitem__(pk, record)
+            if self.log is not None:
+                self.log.append(self.name, SET, pk, dict.__getitem__(self, pk))
+
+    def __delitem__(self, pk):
+        with self.lock.write():
+            super().__delitem__(pk)
+            if self.log is not None:
+                self.log.append(self.name, DELETE, pk)
+
+    def pop(self, pk, default=Table._missing):
+        with self.lock.write():
+            present = dict.__contains__(self, pk)
+            record = super().pop(pk, default)
+            if present and self.log is not None:
+                self.log.append(self.name, DELETE, pk)
+            return record
+
+    def popitem(self):
+        with self.lock.write():
+            pk, record = super().popitem()
+            if self.log is not None:
+                self.log.append(self.name, DELETE, pk)
+            return pk, record
+
+    def clear(self):
+        with self.lock.write():
+            super().clear()
+            if self.log is not None:
+                self.log.append(self.name, CLEAR)
+
+    def restore(self, state, entries):
+        """Load a snapshot ``state`` (or None) and replay log ``entries`` on top."""
+        if state is not None:
+            records = state["records"]
+            if self.record_type is not None:
+                records = {pk: self.record_type.from_dict(record) for pk, record in records.items()}
+            dict.update(self, records)
+            self.version = state["version"]
+            self.last_id = state["last_id"]
+            saved = state["indexes"]
+            for name, index in self.indexes.items():
+                signature, index_data = saved.get(name, (None, None))
+                if signature == index_signature(index):
+                    vars(index).update(index_data)
+                else:
+                    # Declared since the snapshot was taken (or changed): rebuild
+                    for pk, record in dict.items(self):
+                        index.add(pk, record)
+        for op, pk, record in entries:
+            if op == SET:
+                self[pk] = record
+            elif op == DELETE:
+                self.pop(pk, None)
+            else:
+                self.clear()
+
+
+class WALBackend:
+    """In-memory tables made durable by a write-ahead log and snapshots in ``directory``."""
+
+    def __init__(self, directory, snapshot_every=SNAPSHOT_EVERY):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Snapshot n holds everything logged before segment n
+        snapshots = numbered(directory, "snapshot")
+        self.snapshot_number = snapshots[-1] if snapshots else 0
+        segments = [number for number in numbered(directory, "log") if number >= self.snapshot_number]
+        self._pending = {}
+        for number in segments:
+            for name, op, pk, record in read_segment(segment_path(directory, number)):
+                self._pending.setdefault(name, []).append((op, pk, record))
+        self.tables = {}
+        self._snapshot_lock = threading.Lock()
+        # Never append after a possibly torn tail: start a fresh segment
+        number = max(segments + [self.snapshot_number - 1, 0]) + 1
+        self.log = WriteAheadLog(directory, number, snapshot_every, self._snapshot_in_background)
+        atexit.register(self.close)
+
+    def table(self, name, *indexes, record_type=None):
+        table = LoggedTable(name, *indexes, record_type=record_type)
+        table.restore(self._load_snapshot(name), self._pending.pop(name, ()))
+        table.log = self.log
+        self.tables[name] = table
+        return table
+
+    def _load_snapshot(self, name):
+        if not self.snapshot_number:
+            return None
+        path = os.path.join(snapshot_path(self.directory, self.snapshot_number), f"{name}.pickle")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def commit(self):
+        self.log.commit()
+
+    def snapshot(self):
+        """Save every table and drop the log segments and snapshots this one replaces."""
+        with self._snapshot_lock:
+            self._snapshot()
+
+    def _snapshot_in_background(self):
+        def run():
+            # One snapshot at a time; a busy snapshotter will cover these entries
+            if self._snapshot_lock.acquire(blocking=False):
+                try:
+                    self._snapshot()
+                finally:
+                    self._snapshot_lock.release()
+        threading.Thread(target=run, name="wal-snapshot", daemon=True).start()
+
+    def _snapshot(self):
+        # Tables stored earlier but not declared in this run are carried over
+        previous = snapshot_path(self.directory, self.snapshot_number)
+        names = set(self._pending)
+        if self.snapshot_number and os.path.isdir(previous):
+            names.update(file[:-len(".pickle")] for file in os.listdir(previous))
+        for name in names - set(self.tables):
+            self.table(name)
+
+        number = self.log.rotate()
+        temporary = snapshot_path(self.directory, number) + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name, table in list(self.tables.items()):
+            self._save_table(table, os.path.join(temporary, f"{name}.pickle"))
+        fsync_directory(temporary)
+        os.rename(temporary, snapshot_path(self.directory, number))
+        fsync_directory(self.directory)
+
+        for old in numbered(self.directory, "snapshot"):
+            if old < number:
+                shutil.rmtree(snapshot_path(self.directory, old))
+        for old in numbered(self.directory, "log"):
+            if old < number:
+                os.remove(segment_path(self.directory, old))
+        self.snapshot_number = number
+
+    def _save_table(self, table, path):
+        if not hasattr(os, "fork"):
+            with table.lock.read():
+                write_state(table, path)
+            return
+        # The child gets a copy of the table as of the fork and saves it, so
+        # writers are only held up for the fork itself
+        with table.lock.read():
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    write_state(table, path)
+                    status = 0
+                finally:
+                    os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        if status != 0 or not os.path.exists(path):
+            raise OSError(f"Saving table {table.name!r} to {path} failed")
+
+    def close(self):
+        self.log.close()
+        atexit.unregister(self.close)
+
+
+def write_state(table, path):
+    with open(path, "wb") as file:
+        pickle.dump(table_state(table), file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())